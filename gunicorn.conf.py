@@ -0,0 +1,26 @@
+"""
+Configuración de gunicorn. Se carga sola al arrancar desde la raíz del proyecto
+(como en el Procfile: gunicorn wsgi --chdir ./src/).
+
+Con preload_app la aplicación se importa una sola vez en el proceso maestro y
+los workers la heredan al hacer fork, así que arrancan sin volver a importarla.
+GUNICORN_PRELOAD=0 vuelve a importarla en cada worker.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el proceso maestro no se pueden compartir entre
+    # procesos: cada worker empieza con pools vacíos (sin cerrar las del maestro)
+    if not preload_app:
+        return
+    from app import app
+    from models import db
+    from replicas import replicas
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    for replica in replicas.replicas:
+        replica.engine.dispose(close=False)
@@ -80,6 +80,12 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        # La app activa las claves foráneas en SQLite (ver models.py). Las
+        # migraciones "batch" recrean tablas y, con ON DELETE CASCADE, borrar la
+        # tabla original borraría también los favoritos
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -0,0 +1,36 @@
+"""favorites indexes
+
+Revision ID: 3b9d2f6c1a7e
+Revises: 58a6e346e5bf
+Create Date: 2026-10-18 09:12:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d2f6c1a7e'
+down_revision = '58a6e346e5bf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Eliminamos duplicados previos para que se puedan crear los índices únicos
+    op.execute(
+        'DELETE FROM favorites WHERE id NOT IN ('
+        'SELECT MIN(id) FROM favorites GROUP BY user_id, people_id, planet_id)'
+    )
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.create_index('ix_favorites_user_id', ['user_id'], unique=False)
+        batch_op.create_index('uq_favorites_user_people', ['user_id', 'people_id'], unique=True)
+        batch_op.create_index('uq_favorites_user_planet', ['user_id', 'planet_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index('uq_favorites_user_planet')
+        batch_op.drop_index('uq_favorites_user_people')
+        batch_op.drop_index('ix_favorites_user_id')
@@ -0,0 +1,50 @@
+"""password hash and revoked tokens
+
+Revision ID: 5f0b7c3e2a91
+Revises: 7d4c2e9a0b15
+Create Date: 2026-10-18 17:05:12.640218
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b7c3e2a91'
+down_revision = '7d4c2e9a0b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=80), type_=sa.String(length=255),
+                              existing_nullable=False)
+
+    # Las contraseñas guardadas en claro pasan a guardarse como hash
+    method = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('password', sa.String))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(user.c.id, user.c.password).where(~user.c.password.like('pbkdf2:%$%$%')))
+    for user_id, password in rows.all():
+        connection.execute(
+            user.update().where(user.c.id == user_id).values(password=generate_password_hash(password, method=method))
+        )
+
+    op.create_table('revoked_token',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_token_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    # Los hashes no se pueden revertir: las contraseñas siguen guardadas como hash
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_token_expires_at'))
+
+    op.drop_table('revoked_token')
@@ -0,0 +1,67 @@
+"""search indexes
+
+Revision ID: 7d4c2e9a0b15
+Revises: e8a1f5b3c6d2
+Create Date: 2026-10-18 16:21:45.117302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4c2e9a0b15'
+down_revision = 'e8a1f5b3c6d2'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = {
+    'people': ('name', 'species'),
+    'planet': ('name', 'climate', 'terrain'),
+}
+
+
+def tsvector(table, fields):
+    columns = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+    return f"to_tsvector('simple', {columns})"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, fields in SEARCH_FIELDS.items():
+        if dialect == 'postgresql':
+            op.execute(f'CREATE INDEX ix_{table}_search ON {table} USING gin ({tsvector(table, fields)})')
+
+        elif dialect == 'sqlite':
+            # Tabla FTS5 sincronizada con triggers. Ojo: batch_alter_table recrea la
+            # tabla en SQLite y borra los triggers; hay que volver a crearlos después.
+            columns = ', '.join(fields)
+            new_values = ', '.join(f'new.{field}' for field in fields)
+            old_values = ', '.join(f'old.{field}' for field in fields)
+            op.execute(f"CREATE VIRTUAL TABLE {table}_fts USING fts5({columns}, content='{table}', content_rowid='id', prefix='2 3')")
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new_values}); END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_au AFTER UPDATE OF {columns} ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f'INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new_values}); END'
+            )
+            op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_FIELDS:
+        if dialect == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_search')
+
+        elif dialect == 'sqlite':
+            for trigger in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+            op.execute(f'DROP TABLE IF EXISTS {table}_fts')
@@ -0,0 +1,54 @@
+"""favorites on delete cascade
+
+Revision ID: b2e7f4a9c015
+Revises: 9a4d1e6b7c38
+Create Date: 2026-10-18 19:03:48.551276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e7f4a9c015'
+down_revision = '9a4d1e6b7c38'
+branch_labels = None
+depends_on = None
+
+# En SQLite las claves foráneas no tienen nombre: se les da uno con esta convención
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+CASCADED = (('people_id', 'people'), ('planet_id', 'planet'))
+
+
+def foreign_key_names():
+    names = {}
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys('favorites'):
+        column = foreign_key['constrained_columns'][0]
+        names[column] = foreign_key['name'] or f'fk_favorites_{column}_{foreign_key["referred_table"]}'
+    return names
+
+
+def recreate_foreign_keys(ondelete):
+    names = foreign_key_names()
+    with op.batch_alter_table('favorites', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        for column, table in CASCADED:
+            batch_op.drop_constraint(names[column], type_='foreignkey')
+            batch_op.create_foreign_key(f'fk_favorites_{column}_{table}', table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    # Al borrar un personaje o planeta la base de datos borra sus favoritos
+    recreate_foreign_keys('CASCADE')
+
+    # Índices para que el borrado en cascada no recorra toda la tabla
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.create_index('ix_favorites_people_id', ['people_id'], unique=False)
+        batch_op.create_index('ix_favorites_planet_id', ['planet_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorites_planet_id')
+        batch_op.drop_index('ix_favorites_people_id')
+
+    recreate_foreign_keys(None)
@@ -0,0 +1,34 @@
+"""table version
+
+Revision ID: c41e8a7f9d20
+Revises: 3b9d2f6c1a7e
+Create Date: 2026-10-18 11:40:03.551927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8a7f9d20'
+down_revision = '3b9d2f6c1a7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=25), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [
+        {'name': 'user', 'version': 0},
+        {'name': 'people', 'version': 0},
+        {'name': 'planet', 'version': 0},
+        {'name': 'favorites', 'version': 0},
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,46 @@
+"""favorite counts
+
+Revision ID: e8a1f5b3c6d2
+Revises: c41e8a7f9d20
+Create Date: 2026-10-18 15:02:17.904385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a1f5b3c6d2'
+down_revision = 'c41e8a7f9d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_people_favorite_count', ['favorite_count', 'id'], unique=False)
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_planet_favorite_count', ['favorite_count', 'id'], unique=False)
+
+    # Contadores iniciales a partir de los favoritos existentes
+    op.execute(
+        'UPDATE people SET favorite_count = '
+        '(SELECT COUNT(*) FROM favorites WHERE favorites.people_id = people.id)'
+    )
+    op.execute(
+        'UPDATE planet SET favorite_count = '
+        '(SELECT COUNT(*) FROM favorites WHERE favorites.planet_id = planet.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index('ix_planet_favorite_count')
+        batch_op.drop_column('favorite_count')
+
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.drop_index('ix_people_favorite_count')
+        batch_op.drop_column('favorite_count')
@@ -1,16 +1,24 @@
-import os
 from flask_admin import Admin
-from models import db, User, People, Planet, Favorites
+from models import db, User, People, Planet, Favorites, is_password_hash
 from flask_admin.contrib.sqla import ModelView
 
+
+# Las contraseñas escritas en el formulario se guardan como hash
+class UserView(ModelView):
+    column_exclude_list = ['password']
+
+    def on_model_change(self, form, model, is_created):
+        if not is_password_hash(model.password):
+            model.set_password(model.password)
+
+
 def setup_admin(app):
-    app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
     
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
+    admin.add_view(UserView(User, db.session))
 
     # You can duplicate that line to add mew models
     # admin.add_view(ModelView(YourModelName, db.session))
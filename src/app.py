@@ -2,17 +2,31 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, request, jsonify, url_for, g, make_response
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, People, Planet, Favorites
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import insert, delete, select, exists, literal, text, func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload
+from utils import APIException, cached_sitemap, get_page_args, get_int_arg, get_fields, get_include, list_query, paginate_keyset, wants_stream, stream_ndjson, missing_fields
+from cache import setup_cache, entity_cache, cached_serialize
+from versions import setup_versions, conditional, matching_etag
+from auth import setup_auth, token_required, owner_required, create_token, revoke_token
+from compression import setup_compression
+from ratelimit import setup_ratelimit, limiter, limit, exempt
+from idempotency import idempotent
+from replicas import setup_replicas, read_only, replicas
+from instrumentation import setup_instrumentation
+from commands import setup_commands
+from json_provider import FastJSONProvider
+from search import search
+from models import db, User, People, Planet, Favorites, change_favorite_count, recount_favorites, check_dummy_password
 
 #from models import Person
 
 app = Flask(__name__)
+# JSON con orjson si está instalado (ver json_provider.py)
+app.json = FastJSONProvider(app)
 app.url_map.strict_slashes = False
 
 db_url = os.getenv("DATABASE_URL")
@@ -22,10 +36,126 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-MIGRATE = Migrate(app, db)
+# Pool de conexiones del motor (uno por worker de gunicorn). El total de conexiones
+# posibles es workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+engine_options = {
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+}
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    engine_options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    })
+statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+if statement_timeout and app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    engine_options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+# Paginación opcional (?limit=&after_id= o ?cursor=) de los listados
+app.config['PAGINATION_DEFAULT_LIMIT'] = int(os.getenv('PAGINATION_DEFAULT_LIMIT', 20))
+app.config['PAGINATION_MAX_LIMIT'] = int(os.getenv('PAGINATION_MAX_LIMIT', 100))
+
+# Filas leídas por lote al exportar un listado en streaming (NDJSON)
+app.config['STREAM_BATCH_SIZE'] = int(os.getenv('STREAM_BATCH_SIZE', 500))
+
+# Caché en memoria de /people/<id>, /planets/<id> y /user/<id> (CACHE_TTL en segundos)
+app.config['CACHE_MAXSIZE'] = int(os.getenv('CACHE_MAXSIZE', 1024))
+app.config['CACHE_TTL'] = float(os.getenv('CACHE_TTL', 60))
+
+# Búsqueda: desplazamiento máximo permitido en los resultados ordenados por relevancia
+app.config['SEARCH_MAX_OFFSET'] = int(os.getenv('SEARCH_MAX_OFFSET', 1000))
+
+# Altas masivas: máximo de elementos por petición y filas por INSERT
+app.config['BULK_MAX_ITEMS'] = int(os.getenv('BULK_MAX_ITEMS', 1000))
+app.config['BULK_CHUNK_SIZE'] = int(os.getenv('BULK_CHUNK_SIZE', 500))
+
+# Métricas por petición (Server-Timing y log). SLOW_QUERY_MS=0 desactiva el log de consultas lentas
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '1') == '1'
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+
+# Clave para firmar las sesiones de Flask-Admin y los tokens de autenticación.
+# Sin FLASK_APP_KEY solo hay clave de ejemplo en modo debug (FLASK_DEBUG=1); fuera
+# de debug la API no emite ni acepta tokens (cualquiera podría firmarlos)
+app.secret_key = os.environ.get('FLASK_APP_KEY') or ('sample key' if app.debug else None)
+
+# Autenticación: método de hash de las contraseñas (pbkdf2:<hash>:<iteraciones>),
+# duración de los tokens en segundos y caché de tokens revocados
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+app.config['AUTH_TOKEN_TTL'] = int(os.getenv('AUTH_TOKEN_TTL', 86400))
+app.config['AUTH_REVOCATION_CACHE_MAXSIZE'] = int(os.getenv('AUTH_REVOCATION_CACHE_MAXSIZE', 10000))
+app.config['AUTH_REVOCATION_CACHE_TTL'] = float(os.getenv('AUTH_REVOCATION_CACHE_TTL', 30))
+
+# Proxies delante de la aplicación (1 en Render y Heroku). Con PROXY_COUNT=0 se
+# ignora X-Forwarded-For: detrás de un proxy todos los clientes tendrían su IP
+app.config['PROXY_COUNT'] = int(os.getenv('PROXY_COUNT', 0))
+if app.config['PROXY_COUNT']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'], x_proto=app.config['PROXY_COUNT'])
+
+# Límite de peticiones por IP (token bucket): general, escrituras, login y
+# favoritos, más un máximo de peticiones simultáneas por cliente en cada worker.
+# RATELIMIT_STORAGE_URL=redis://host:6379/0 comparte los límites entre workers.
+# Por defecto solo está activo con PROXY_COUNT (sin él, detrás de un proxy todos
+# los clientes compartirían un bucket); RATELIMIT_ENABLED=1 lo activa sin proxy
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', '1' if app.config['PROXY_COUNT'] else '0') == '1'
+app.config['RATELIMIT_STORAGE_URL'] = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+app.config['RATELIMIT_DEFAULT'] = os.getenv('RATELIMIT_DEFAULT', '300/minute')
+app.config['RATELIMIT_WRITE'] = os.getenv('RATELIMIT_WRITE', '60/minute')
+app.config['RATELIMIT_LOGIN'] = os.getenv('RATELIMIT_LOGIN', '10/minute')
+app.config['RATELIMIT_FAVORITES'] = os.getenv('RATELIMIT_FAVORITES', '120/minute')
+app.config['RATELIMIT_CONCURRENCY'] = int(os.getenv('RATELIMIT_CONCURRENCY', 8))
+app.config['RATELIMIT_MAX_CLIENTS'] = int(os.getenv('RATELIMIT_MAX_CLIENTS', 100000))
+
+# Idempotency-Key en las altas: tiempo que se guarda cada respuesta y tiempo tras
+# el que una petición que no terminó deja de bloquear su clave (segundos)
+app.config['IDEMPOTENCY_TTL'] = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+app.config['IDEMPOTENCY_LOCK_TIMEOUT'] = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+# Réplicas de lectura (opcional, separadas por comas) para las rutas @read_only.
+# Tras una escritura el cliente lee de la principal durante REPLICA_STICKY_SECONDS;
+# una réplica que falla no se usa durante REPLICA_RETRY_SECONDS
+app.config['DATABASE_REPLICA_URLS'] = os.getenv('DATABASE_REPLICA_URLS', '')
+app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+app.config['REPLICA_RETRY_SECONDS'] = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+# Nodos solo API (API_ONLY=1): sin Flask-Admin ni /spec, que son lo más lento de
+# importar. Cada parte se puede activar o desactivar por separado con su variable.
+# El comando "flask db" sigue activo aunque API_ONLY=1: el release del Procfile
+# (flask db upgrade) se ejecuta con las mismas variables que el servicio
+api_only = os.getenv('API_ONLY', '0') == '1'
+app.config['ENABLE_ADMIN'] = os.getenv('ENABLE_ADMIN', '0' if api_only else '1') == '1'
+app.config['ENABLE_SWAGGER'] = os.getenv('ENABLE_SWAGGER', '0' if api_only else '1') == '1'
+app.config['ENABLE_MIGRATE'] = os.getenv('ENABLE_MIGRATE', '1') == '1'
+
+# Tiempo (segundos) que navegadores y proxies pueden reutilizar el sitemap de /
+app.config['SITEMAP_MAX_AGE'] = int(os.getenv('SITEMAP_MAX_AGE', 300))
+
+# Compresión gzip/brotli según Accept-Encoding. COMPRESSION_LEVEL (gzip, 1-9),
+# COMPRESSION_BROTLI_LEVEL (0-11) y tamaño mínimo en bytes para comprimir
+app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 500))
+app.config['COMPRESSION_LEVEL'] = int(os.getenv('COMPRESSION_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_LEVEL'] = int(os.getenv('COMPRESSION_BROTLI_LEVEL', 4))
+
+setup_instrumentation(app)
+setup_ratelimit(app)
 db.init_app(app)
+setup_replicas(app)
 CORS(app)
-setup_admin(app)
+# Flask-Migrate y Flask-Admin solo se importan si están activados
+if app.config['ENABLE_MIGRATE']:
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(app, db)
+if app.config['ENABLE_ADMIN']:
+    from admin import setup_admin
+    setup_admin(app)
+setup_cache(app)
+setup_auth(app)
+setup_versions(app)
+setup_compression(app)
+setup_commands(app)
 
 # # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -33,9 +163,31 @@ def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 # # generate sitemap with all your endpoints
+# Se genera en la primera petición y después se sirve desde memoria, con ETag
+# y Cache-Control (SITEMAP_MAX_AGE segundos)
 @app.route('/')
+@exempt
 def sitemap():
-    return generate_sitemap(app)
+    html, etag = cached_sitemap(app)
+    matched = matching_etag(request.if_none_match, etag)
+    response = make_response(html if matched is None else '', 200 if matched is None else 304)
+    response.set_etag(matched or etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['SITEMAP_MAX_AGE']
+    return response
+
+# Health check para el balanceador: no consulta la base de datos ni las rutas
+@app.route('/healthz', methods=['GET'])
+@exempt
+def healthz():
+    return 'ok', 200, {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'}
+
+# Especificación Swagger de la API (flask_swagger se importa en la primera petición)
+if app.config['ENABLE_SWAGGER']:
+    @app.route('/spec', methods=['GET'])
+    def spec():
+        from flask_swagger import swagger
+        return jsonify(swagger(app)), 200
 
 
 
@@ -44,23 +196,41 @@ def sitemap():
 # Aquí añado mis endpoints
 
 # Listar todos los registros de people en la base de datos.
+# Con ?limit=, ?after_id= o ?cursor= devuelve una página y el cursor siguiente.
+# Con ?stream=1 o Accept: application/x-ndjson exporta la tabla completa en NDJSON.
+# Con ?fields=id,name solo se leen y devuelven esos campos.
 
 @app.route('/people', methods=['GET'])
+@read_only
+@conditional('people')
 def get_people():
-    people = People.query.all()
-    people_list = [person.serialize() for person in people]
+    query, serialize = list_query(People, get_fields(People))
+    if wants_stream():
+        return stream_ndjson(query.order_by(People.id), serialize)
+
+    page = get_page_args()
+    if page is not None:
+        people, next_cursor = paginate_keyset(query, People, *page)
+        return jsonify({
+            'people': [serialize(person) for person in people],
+            'next_cursor': next_cursor
+        }), 200
+
+    people = query.all()
+    people_list = [serialize(person) for person in people]
     return jsonify(people_list), 200
 
 
 #  Muestra la información de un solo personaje según su id.
 
 @app.route('/people/<int:people_id>', methods=['GET'])
+@conditional('people')
 def get_person(people_id):
-    people = People.query.filter_by(id = people_id).first()
+    people = cached_serialize(People, people_id, get_fields(People))
     if people:
         response_body = {
         'message': 'Personaje encontrado',
-        'people': people.serialize()
+        'people': people
     }
         return jsonify(response_body), 200
     else: 
@@ -71,11 +241,28 @@ def get_person(people_id):
 
 
 # Listar todos los registros de planets en la base de datos.
+# Con ?limit=, ?after_id= o ?cursor= devuelve una página y el cursor siguiente.
+# Con ?stream=1 o Accept: application/x-ndjson exporta la tabla completa en NDJSON.
+# Con ?fields=id,name solo se leen y devuelven esos campos.
 
 @app.route('/planets', methods=['GET'])
+@read_only
+@conditional('planet')
 def get_planets():
-    planets = Planet.query.all()
-    planets_list = [planet.serialize() for planet in planets]
+    query, serialize = list_query(Planet, get_fields(Planet))
+    if wants_stream():
+        return stream_ndjson(query.order_by(Planet.id), serialize)
+
+    page = get_page_args()
+    if page is not None:
+        planets, next_cursor = paginate_keyset(query, Planet, *page)
+        return jsonify({
+            'planets': [serialize(planet) for planet in planets],
+            'next_cursor': next_cursor
+        }), 200
+
+    planets = query.all()
+    planets_list = [serialize(planet) for planet in planets]
     return jsonify(planets_list), 200
 
 
@@ -83,12 +270,13 @@ def get_planets():
 # Muestra la información de un solo planeta según su id.
 
 @app.route('/planets/<int:planet_id>', methods=['GET'])
+@conditional('planet')
 def get_planet(planet_id):
-    planet = Planet.query.filter_by(id = planet_id).first()
+    planet = cached_serialize(Planet, planet_id, get_fields(Planet))
     if planet:
         response_body = {
             'message': 'Planeta encontrado',
-            'planet': planet.serialize()
+            'planet': planet
         }
         return jsonify(response_body), 200
 
@@ -100,10 +288,27 @@ def get_planet(planet_id):
 
 
 
+# Listar los usuarios (admite la misma paginación y el mismo streaming que /people).
+
 @app.route('/users', methods=['GET'])
+@read_only
+@conditional('user')
 def get_users():
-    users = User.query.all()
-    users_list = [user.serialize() for user in users]
+    query, serialize = list_query(User, get_fields(User))
+    if wants_stream():
+        return stream_ndjson(query.order_by(User.id), serialize)
+
+    page = get_page_args()
+    if page is not None:
+        users, next_cursor = paginate_keyset(query, User, *page)
+        return jsonify({
+            'message': 'Lista de usuarios',
+            'users': [serialize(user) for user in users],
+            'next_cursor': next_cursor
+        }), 200
+
+    users = query.all()
+    users_list = [serialize(user) for user in users]
     response_body = {
         'message': 'Lista de usuarios',
         'users': users_list
@@ -114,12 +319,13 @@ def get_users():
 
 
 @app.route('/user/<int:user_id>', methods=['GET'])
+@conditional('user')
 def get_user(user_id):
-    user = User.query.filter_by(id = user_id).first()
+    user = cached_serialize(User, user_id, get_fields(User))
     if user:
         response_body = {
         'message': 'Usuario encontrado',
-        'user': user.serialize()
+        'user': user
     }
         return jsonify(response_body), 200
     else: 
@@ -129,17 +335,62 @@ def get_user(user_id):
         return jsonify(response_body), 400
     
 
+# Inicia sesión con email y contraseña y devuelve un token para la cabecera
+# Authorization: Bearer <token> de las rutas de favoritos.
+
+@app.route('/login', methods=['POST'])
+@limit(app.config['RATELIMIT_LOGIN'])
+def login():
+    body = request.get_json(silent=True) or {}
+    email = body.get('email')
+    password = body.get('password')
+    if not email or not password:
+        return jsonify({
+            'msg': 'Email y contraseña requeridos'
+        }), 400
+
+    user = User.query.filter_by(email=email).first()
+    # Con un email desconocido también se calcula un hash, para que el tiempo de
+    # respuesta no revele qué emails están registrados
+    if user is None:
+        valid = check_dummy_password(password)
+    else:
+        valid = user.check_password(password) and user.is_active
+    if not valid:
+        return jsonify({
+            'msg': 'Email o contraseña incorrectos'
+        }), 401
+    # check_password puede haber actualizado el hash
+    db.session.commit()
+
+    return jsonify({
+        'msg': 'Sesión iniciada',
+        'token': create_token(user.id),
+        'expires_in': app.config['AUTH_TOKEN_TTL'],
+        'user': user.serialize()
+    }), 200
+
+
+# Revoca el token con el que se hace la petición.
+
+@app.route('/logout', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
+def logout():
+    revoke_token(g.token_jti)
+    return jsonify({
+        'msg': 'Sesión cerrada'
+    }), 200
+
+
 #  Añade un nuevo planeta favorito al usuario actual con el id = planet_id.
 
 @app.route('/favorite/planet/<int:planet_id>', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
+@idempotent
 def add_favorite_planet(planet_id):
-    body = request.get_json()
-    user_id = body.get('user_id', None)
-
-    if user_id is None:
-        return jsonify ({
-            'msg': 'Usuario Id requerido'
-        }), 400
+    user_id = g.user_id
     user = User.query.get(user_id)
     if user is None:
         return jsonify ({
@@ -152,23 +403,51 @@ def add_favorite_planet(planet_id):
             'msg': 'Planeta no encontrado'
         }), 400
     
-    exists_favorite = Favorites.query.filter_by(user_id=user_id, planet_id=planet_id).first()
-    if exists_favorite:
+    # El índice único (user_id, planet_id) detecta los duplicados al insertar
+    new_favorite = Favorites(user_id=user_id, planet_id=planet_id)
+    db.session.add(new_favorite)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
         return jsonify ({
             'msg': 'El planeta ya está en favoritos'
         }), 400
-
-    new_favorite = Favorites(user_id=user_id, planet_id=planet_id)
-    db.session.add(new_favorite)
+    change_favorite_count(Planet, planet_id, 1)
     db.session.commit()
     return jsonify ({
             'msg': 'Se añadió a favoritos'
         }), 200
     
 
+# Lista de favoritos con los datos completos del personaje o planeta.
+# Los favoritos deben venir con people y planet ya cargados (joinedload).
+
+def serialize_favorites(favorites):
+    favorite_list = []
+    for favorite in favorites:
+        if favorite.people_id is not None:
+            favorite_list.append({
+                'type': 'person',
+                'details': favorite.people.serialize()
+            })
+
+        if favorite.planet_id is not None:
+            favorite_list.append({
+                'type': 'planet',
+                'details': favorite.planet.serialize()
+            })
+    return favorite_list
+
+
 # [GET] /users/favorites Listar todos los favoritos que pertenecen al usuario actual.
 
 @app.route('/users/<int:user_id>/favorites', methods=['GET'])
+@limit(app.config['RATELIMIT_FAVORITES'])
+@token_required
+@owner_required
+@read_only
+@conditional('user', 'favorites', 'people', 'planet')
 def get_favorites(user_id):
     user = User.query.get(user_id)
     if user is None:
@@ -176,8 +455,12 @@ def get_favorites(user_id):
             'msg': 'Usuario no encontrado'
         }), 404
     
-    # Obtener todos los favoritos de este usuario
-    favorites = Favorites.query.filter_by(user_id=user_id).all()
+    # Obtener todos los favoritos de este usuario, cargando en la misma
+    # consulta el personaje o planeta asociado (evita una consulta por favorito)
+    favorites = Favorites.query.filter_by(user_id=user_id).options(
+        joinedload(Favorites.people),
+        joinedload(Favorites.planet)
+    ).all()
 
     # Verificamos si hay favoritos
     if not favorites:
@@ -185,43 +468,75 @@ def get_favorites(user_id):
             'msg': 'No hay favoritos'
         }), 200
     
-    # Crear una lista para almacenar los favoritos
-    favorite_list = []
-
-    for favorite in favorites:
-        if favorite.people_id is not None:
-            people = People.query.get(favorite.people_id)
-            favorite_list.append({
-                'type': 'person',
-                'details': people.serialize()
-            })
-        
-        if favorite.planet_id is not None:
-            planet = Planet.query.get(favorite.planet_id)
-            favorite_list.append({
-                'type': 'planet',
-                'details': planet.serialize()
-            })
-
     # Devolver la lista de favoritos en formato JSON
     return jsonify({
         'msg': 'Favoritos encontrados',
-        'favorites': favorite_list
+        'favorites': serialize_favorites(favorites)
     }), 200
     
 
+# Perfil del usuario en una sola petición: sus datos, sus favoritos con los datos
+# completos de cada personaje o planeta y cuántos tiene de cada tipo.
+# Con ?include=user,favorites,counts se eligen las secciones (por defecto todas).
+# Como máximo cuatro consultas, sin importar cuántos favoritos tenga: token
+# revocado (si no está en la caché de revocaciones), versiones (ETag), usuario
+# (si no está en caché) y favoritos; sin la sección favorites, los contadores
+# salen de un COUNT.
+
+PROFILE_SECTIONS = ('user', 'favorites', 'counts')
+
+@app.route('/users/<int:user_id>/profile', methods=['GET'])
+@limit(app.config['RATELIMIT_FAVORITES'])
+@token_required
+@owner_required
+@read_only
+@conditional('user', 'favorites', 'people', 'planet')
+def get_profile(user_id):
+    include = get_include(PROFILE_SECTIONS)
+
+    user = cached_serialize(User, user_id)
+    if user is None:
+        return jsonify({
+            'msg': 'Usuario no encontrado'
+        }), 404
+
+    response_body = {'msg': 'Perfil encontrado'}
+    if 'user' in include:
+        response_body['user'] = user
+
+    if 'favorites' in include:
+        favorites = Favorites.query.filter_by(user_id=user_id).options(
+            joinedload(Favorites.people),
+            joinedload(Favorites.planet)
+        ).all()
+        response_body['favorites'] = serialize_favorites(favorites)
+        people_count = sum(1 for favorite in favorites if favorite.people_id is not None)
+        planet_count = sum(1 for favorite in favorites if favorite.planet_id is not None)
+    elif 'counts' in include:
+        # COUNT(columna) no cuenta los NULL: cada favorito es de personaje o de planeta
+        people_count, planet_count = db.session.execute(
+            select(func.count(Favorites.people_id), func.count(Favorites.planet_id))
+            .where(Favorites.user_id == user_id)
+        ).one()
+
+    if 'counts' in include:
+        response_body['counts'] = {
+            'people': people_count,
+            'planets': planet_count,
+            'total': people_count + planet_count,
+        }
+
+    return jsonify(response_body), 200
+
+
 # Agrega un people favorito con el id = people_id.
 
 @app.route('/favorite/people/<int:people_id>', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
+@idempotent
 def favorite_people(people_id):
-    body = request.get_json()
-    user_id = body.get('user_id', None)
-
-    if user_id is None:
-        return jsonify({
-            'msg': 'Usuario Id requerido'
-        }), 400
-    
+    user_id = g.user_id
     user = User.query.get(user_id)
     if user is None:
         return jsonify({
@@ -234,14 +549,17 @@ def favorite_people(people_id):
             'msg': 'Personaje no encontrado'
         }), 400
     
-    exist_favorite = Favorites.query.filter_by(user_id=user_id, people_id=people_id).first()
-    if exist_favorite:
+    # El índice único (user_id, people_id) detecta los duplicados al insertar
+    new_favorite = Favorites(user_id=user_id, people_id=people_id)
+    db.session.add(new_favorite)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
         return jsonify({
             'msg': 'El personaje ya está en favoritos'
         }), 400
-    
-    new_favorite = Favorites(user_id=user_id, people_id=people_id)
-    db.session.add(new_favorite)
+    change_favorite_count(People, people_id, 1)
     db.session.commit()
 
     return jsonify({
@@ -251,18 +569,12 @@ def favorite_people(people_id):
 # Elimina un planet favorito con el id = planet_id.
 
 @app.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
 def delete_favorite_planet(planet_id):
-    # Obtener el cuerpo de la solicitud (JSON) enviado por el cliente.
-    body = request.get_json()
+    # El usuario es el del token de la cabecera Authorization.
+    user_id = g.user_id
 
-    # Verificar si el user_id fue proporcionado en el cuerpo de la solicitud.
-    # Si no se proporciona, devolver un error 400 con un mensaje explicativo.
-    user_id = body.get('user_id', None)
-    if user_id is None:
-        return jsonify({
-            'msg': 'Usuario Id requerido'
-        }), 400
-    
     # Buscar si el usuario existe en la base de datos.
     user = User.query.get(user_id)
     if user is None:
@@ -275,6 +587,7 @@ def delete_favorite_planet(planet_id):
 
     if planet_delete:
         db.session.delete(planet_delete)
+        change_favorite_count(Planet, planet_id, -1)
         db.session.commit()
 
         return jsonify({
@@ -289,14 +602,10 @@ def delete_favorite_planet(planet_id):
 # Elimina un people favorito con el id = people_id.
 
 @app.route('/favorite/people/<int:people_id>', methods=['DELETE'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
 def delete_favorite_people(people_id):
-    body = request.get_json()
-    user_id = body.get('user_id', None)
-
-    if user_id is None:
-        return jsonify({
-            'msg': 'Usuario Id requerido'
-        }), 400
+    user_id = g.user_id
     user = User.query.get(user_id)
     if user is None:
         return jsonify({
@@ -306,6 +615,7 @@ def delete_favorite_people(people_id):
     people_delete = Favorites.query.filter_by(user_id=user_id, people_id=people_id).first()
     if people_delete:
         db.session.delete(people_delete)
+        change_favorite_count(People, people_id, -1)
         db.session.commit()
         response_body = {
             'msg': 'Personaje eliminado con éxito'
@@ -318,11 +628,119 @@ def delete_favorite_people(people_id):
         return jsonify(response_body), 404
 
 
+# Añade y elimina varios favoritos del usuario en una sola petición.
+# Cuerpo: {"add": {"people": [ids], "planets": [ids]}, "remove": {"people": [ids], "planets": [ids]}}
+# Primero se aplican las eliminaciones y después las altas, todo en una transacción.
+
+def parse_id_list(section, key):
+    ids = section.get(key, [])
+    if not isinstance(ids, list) or any(type(item) is not int for item in ids):
+        raise APIException(f'{key} debe ser una lista de ids enteros', status_code=400)
+    return set(ids)
+
+
+def apply_favorites_batch(user_id, targets, add_ids, remove_ids):
+    # Ejecuta los DELETE e INSERT ... SELECT del lote (sin commit) y devuelve el resumen
+    result = {'added': {}, 'removed': {}, 'not_found': {}}
+    for key, model, column in targets:
+        changed_ids = remove_ids[key] | add_ids[key]
+        removed = 0
+        if remove_ids[key]:
+            removed = db.session.execute(
+                delete(Favorites)
+                .where(Favorites.user_id == user_id, column.in_(remove_ids[key]))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        result['removed'][key] = removed
+
+        added = 0
+        not_found = []
+        if add_ids[key]:
+            found = {row[0] for row in db.session.execute(
+                select(model.id).where(model.id.in_(add_ids[key]))
+            )}
+            not_found = sorted(add_ids[key] - found)
+            if found:
+                # Un solo INSERT ... SELECT que descarta los que ya son favoritos
+                already_favorite = exists().where(Favorites.user_id == user_id, column == model.id)
+                new_rows = select(literal(user_id), model.id).where(model.id.in_(found), ~already_favorite)
+                added = db.session.execute(
+                    insert(Favorites).from_select(['user_id', column.key], new_rows)
+                ).rowcount
+        result['added'][key] = added
+        result['not_found'][key] = not_found
+
+        if removed or added:
+            recount_favorites(model, changed_ids)
+    return result
+
+
+@app.route('/users/<int:user_id>/favorites/batch', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@token_required
+@owner_required
+def batch_favorites(user_id):
+    body = request.get_json()
+    if not isinstance(body, dict):
+        return jsonify({
+            'msg': 'Cuerpo de la petición inválido'
+        }), 400
+
+    to_add = body.get('add') or {}
+    to_remove = body.get('remove') or {}
+    if not isinstance(to_add, dict) or not isinstance(to_remove, dict):
+        return jsonify({
+            'msg': 'add y remove deben ser objetos'
+        }), 400
+
+    targets = (
+        ('people', People, Favorites.people_id),
+        ('planets', Planet, Favorites.planet_id),
+    )
+    add_ids = {key: parse_id_list(to_add, key) for key, _, _ in targets}
+    remove_ids = {key: parse_id_list(to_remove, key) for key, _, _ in targets}
+
+    total = sum(len(ids) for ids in add_ids.values()) + sum(len(ids) for ids in remove_ids.values())
+    max_items = app.config['BULK_MAX_ITEMS']
+    if total > max_items:
+        return jsonify({
+            'msg': f'Se permiten como máximo {max_items} elementos por petición'
+        }), 413
+
+    user = User.query.get(user_id)
+    if user is None:
+        return jsonify({
+            'msg': 'Usuario no encontrado'
+        }), 404
+
+    # Un favorito añadido a la vez por otra petición hace fallar el INSERT (no
+    # solo el commit): todo el lote va dentro del try
+    try:
+        result = apply_favorites_batch(user_id, targets, add_ids, remove_ids)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({
+            'msg': 'Los favoritos cambiaron durante la petición, inténtalo de nuevo'
+        }), 409
+
+    return jsonify({
+        'msg': 'Favoritos actualizados',
+        **result
+    }), 200
+
+
+PEOPLE_FIELDS = ('name', 'gender', 'species')
+PLANET_FIELDS = ('name', 'climate', 'terrain')
+
+
 # Crear un nuevo personaje.
 @app.route('/people', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@idempotent
 def create_character():
     body = request.get_json()
-    if not body.get('name') or not body.get('gender') or not body.get('species'):
+    if missing_fields(body, PEOPLE_FIELDS):
         return jsonify({
             'msg': 'Faltan datos'
         }), 400
@@ -336,9 +754,11 @@ def create_character():
 # Crear nuevo planeta.
 
 @app.route('/planet', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@idempotent
 def create_planet():
     body = request.get_json()
-    if not body.get('name') or not body.get('climate') or not body.get('terrain'):
+    if missing_fields(body, PLANET_FIELDS):
         return jsonify({
             'msg': 'Faltan datos'
         }), 400
@@ -348,9 +768,66 @@ def create_planet():
     return jsonify(new_planet.serialize()), 201
 
 
+# Altas masivas: recibe una lista JSON, valida cada elemento igual que las
+# altas individuales e inserta todo en una sola transacción (executemany por lotes).
+
+def bulk_create(model, fields, message):
+    items = request.get_json()
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            'msg': 'Se esperaba una lista de elementos'
+        }), 400
+
+    max_items = app.config['BULK_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({
+            'msg': f'Se permiten como máximo {max_items} elementos por petición'
+        }), 413
+
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        missing = missing_fields(item, fields)
+        if missing:
+            errors.append({'index': index, 'msg': 'Faltan datos', 'missing': missing})
+        else:
+            rows.append({field: item[field] for field in fields})
+
+    if errors:
+        return jsonify({
+            'msg': 'Faltan datos',
+            'errors': errors
+        }), 400
+
+    chunk_size = app.config['BULK_CHUNK_SIZE']
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(model), rows[start:start + chunk_size])
+    db.session.commit()
+
+    return jsonify({
+        'msg': message,
+        'created': len(rows)
+    }), 201
+
+
+@app.route('/people/bulk', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@idempotent
+def create_characters_bulk():
+    return bulk_create(People, PEOPLE_FIELDS, 'Personajes creados')
+
+
+@app.route('/planet/bulk', methods=['POST'])
+@limit(app.config['RATELIMIT_WRITE'])
+@idempotent
+def create_planets_bulk():
+    return bulk_create(Planet, PLANET_FIELDS, 'Planetas creados')
+
+
 # Editar personaje:
 
 @app.route('/people/<int:people_id>', methods=['PUT'])
+@limit(app.config['RATELIMIT_WRITE'])
 def update_character(people_id):
     body = request.get_json()
     character = People.query.get(people_id)
@@ -362,12 +839,14 @@ def update_character(people_id):
     character.gender = body.get('gender', character.gender)
     character.species = body.get('species', character.species)
     db.session.commit()
+    entity_cache.invalidate(('people', people_id))
     return jsonify(character.serialize()), 200
 
 
 # Editar planeta:
 
 @app.route('/planet/<int:planet_id>', methods=['PUT'])
+@limit(app.config['RATELIMIT_WRITE'])
 def update_planet(planet_id):
     body = request.get_json()
     planet = Planet.query.get(planet_id)
@@ -379,11 +858,13 @@ def update_planet(planet_id):
     planet.climate = body.get('climate', planet.climate)
     planet.terrain = body.get('terrain', planet.terrain)
     db.session.commit()
+    entity_cache.invalidate(('planet', planet_id))
     return jsonify(planet.serialize()), 200
 
 
 # Delete personaje:
 @app.route('/people/<int:people_id>', methods=['DELETE'])
+@limit(app.config['RATELIMIT_WRITE'])
 def delete_character(people_id):
     character = People.query.get(people_id)
     if not character:
@@ -392,12 +873,14 @@ def delete_character(people_id):
         }), 404
     db.session.delete(character)
     db.session.commit()
+    entity_cache.invalidate(('people', people_id))
     return jsonify({
         'msg': 'Personaje eliminado con éxito'
     }), 200
 
 # Delete planeta:
 @app.route('/planet/<int:planet_id>', methods=['DELETE'])
+@limit(app.config['RATELIMIT_WRITE'])
 def delete_planet(planet_id):
     planet = Planet.query.get(planet_id)
     if not planet:
@@ -406,11 +889,123 @@ def delete_planet(planet_id):
         }), 404
     db.session.delete(planet)
     db.session.commit()
+    entity_cache.invalidate(('planet', planet_id))
     return jsonify({
         'msg': 'Planeta eliminado con éxito'
     }), 200
 
 
+# Búsqueda por texto en personajes (name, species) y planetas (name, climate, terrain).
+# /search?q=tat&type=people|planet&limit=20&offset=0 (sin type busca en ambos)
+
+@app.route('/search', methods=['GET'])
+def search_entities():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'msg': 'El parámetro q es obligatorio'
+        }), 400
+
+    kinds = {'people': People, 'planet': Planet}
+    kind = request.args.get('type')
+    if kind is not None and kind not in kinds:
+        return jsonify({
+            'msg': 'type debe ser people o planet'
+        }), 400
+
+    limit = get_int_arg('limit')
+    limit = app.config['PAGINATION_DEFAULT_LIMIT'] if limit is None else limit
+    offset = get_int_arg('offset') or 0
+    if limit < 1 or offset < 0:
+        return jsonify({
+            'msg': 'limit debe ser mayor que 0 y offset no puede ser negativo'
+        }), 400
+    limit = min(limit, app.config['PAGINATION_MAX_LIMIT'])
+    offset = min(offset, app.config['SEARCH_MAX_OFFSET'])
+
+    response_body = {'msg': 'Resultados de la búsqueda', 'q': query}
+    for name, model in kinds.items():
+        if kind is not None and kind != name:
+            continue
+        # Se pide un resultado de más para saber si hay otra página
+        results = search(model, query, limit + 1, offset)
+        response_body[name] = {
+            'results': [item.serialize() for item in results[:limit]],
+            'next_offset': offset + limit if len(results) > limit else None
+        }
+    return jsonify(response_body), 200
+
+
+# Personajes o planetas con más favoritos: /stats/top?type=people|planet&n=10
+# Lee el índice sobre favorite_count, sin agrupar la tabla favorites.
+
+@app.route('/stats/top', methods=['GET'])
+def get_top_favorites():
+    models = {'people': People, 'planet': Planet}
+    kind = request.args.get('type', 'people')
+    if kind not in models:
+        return jsonify({
+            'msg': 'type debe ser people o planet'
+        }), 400
+
+    n = get_int_arg('n')
+    n = 10 if n is None else n
+    if n < 1:
+        return jsonify({
+            'msg': 'n debe ser mayor que 0'
+        }), 400
+    n = min(n, app.config['PAGINATION_MAX_LIMIT'])
+
+    model = models[kind]
+    top = model.query.filter(model.favorite_count > 0).order_by(
+        model.favorite_count.desc(), model.id.desc()
+    ).limit(n).all()
+
+    return jsonify({
+        'msg': 'Más favoritos',
+        'type': kind,
+        'results': [dict(item.serialize(), favorite_count=item.favorite_count) for item in top]
+    }), 200
+
+
+# Estado del pool de conexiones y de la base de datos
+@app.route('/health/db', methods=['GET'])
+@exempt
+def health_db():
+    pool = db.engine.pool
+    # Los contadores se leen antes de la consulta para no contar esta conexión
+    response_body = {'pool': type(pool).__name__, 'status': pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            response_body[name] = getattr(pool, name)()
+
+    try:
+        db.session.execute(text('SELECT 1'))
+    except SQLAlchemyError:
+        db.session.rollback()
+        response_body['msg'] = 'Base de datos no disponible'
+        return jsonify(response_body), 503
+
+    response_body['msg'] = 'Base de datos disponible'
+    if replicas.replicas:
+        response_body['replicas'] = replicas.status()
+    return jsonify(response_body), 200
+
+
+# Contadores de la caché de registros individuales
+@app.route('/cache/stats', methods=['GET'])
+@exempt
+def get_cache_stats():
+    return jsonify(entity_cache.stats()), 200
+
+
+# Contadores del límite de peticiones
+@app.route('/ratelimit/stats', methods=['GET'])
+@exempt
+def get_ratelimit_stats():
+    return jsonify(limiter.stats()), 200
+
+
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
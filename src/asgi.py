@@ -0,0 +1,279 @@
+"""
+Punto de entrada ASGI, alternativo a wsgi.py.
+
+Las lecturas más frecuentes (GET /people, /planets, /users y
+/users/<id>/favorites) se atienden con un motor y una sesión asíncronos de
+SQLAlchemy, así un mismo proceso puede tener muchas peticiones esperando a la
+base de datos a la vez. El cuerpo, el código de estado y el ETag son los mismos
+que devuelve la ruta de Flask.
+
+/users/<id>/favorites pide el mismo token que la ruta de Flask, y comparte con
+ella la caché de tokens revocados.
+
+Cualquier otra petición, y también esas mismas rutas cuando llevan parámetros
+(paginación, streaming...) o piden NDJSON, pasan a la aplicación Flask de
+siempre, que asgiref ejecuta en un hilo aparte.
+
+    $ gunicorn asgi --chdir ./src/ -k uvicorn.workers.UvicornWorker
+"""
+import asyncio
+import os
+import re
+from functools import partial
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker, joinedload
+from werkzeug.http import parse_etags
+from app import app as flask_app, serialize_favorites
+from models import User, People, Planet, Favorites, TableVersion, RevokedToken
+from auth import revocation_cache, decode_token, bearer_token, check_revoked, check_user
+from utils import APIException
+from ratelimit import limiter, client_id, too_many_requests_body
+from versions import make_etag, matching_etag
+from compression import choose_encoding, compress, compression_level
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_database_url(url):
+    scheme, rest = url.split('://', 1)
+    return ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + '://' + rest
+
+
+def async_engine_options(options):
+    options = dict(options)
+    connect_args = options.pop('connect_args', None)
+    # asyncpg no admite el parámetro "options" de libpq
+    if connect_args and 'options' in connect_args:
+        timeout = connect_args['options'].rsplit('=', 1)[1]
+        options['connect_args'] = {'server_settings': {'statement_timeout': timeout}}
+    return options
+
+
+engine = create_async_engine(
+    os.getenv('ASYNC_DATABASE_URL') or async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI']),
+    **async_engine_options(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+)
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+# Cada vista devuelve (código, cuerpo) con el mismo contenido que la vista de Flask
+
+async def select_rows(session, model):
+    # Igual que list_query(): solo las columnas de serialize(), sin objetos del ORM
+    fields = model.serialize_fields
+    rows = await session.execute(select(*[getattr(model, field) for field in fields]))
+    return [dict(zip(fields, row)) for row in rows]
+
+
+async def get_people(session):
+    return 200, await select_rows(session, People)
+
+
+async def get_planets(session):
+    return 200, await select_rows(session, Planet)
+
+
+async def get_users(session):
+    return 200, {
+        'message': 'Lista de usuarios',
+        'users': await select_rows(session, User)
+    }
+
+
+async def get_favorites(session, user_id):
+    user = await session.get(User, user_id)
+    if user is None:
+        return 404, {'msg': 'Usuario no encontrado'}
+
+    favorites = (await session.execute(
+        select(Favorites).where(Favorites.user_id == user_id).options(
+            joinedload(Favorites.people),
+            joinedload(Favorites.planet)
+        )
+    )).scalars().all()
+    if not favorites:
+        return 200, {'msg': 'No hay favoritos'}
+
+    return 200, {
+        'msg': 'Favoritos encontrados',
+        'favorites': serialize_favorites(favorites)
+    }
+
+
+# (patrón, vista, tablas de las que depende el ETag, requiere token)
+ROUTES = [
+    (re.compile(r'^/people/?$'), get_people, ('people',), False),
+    (re.compile(r'^/planets/?$'), get_planets, ('planet',), False),
+    (re.compile(r'^/users/?$'), get_users, ('user',), False),
+    (re.compile(r'^/users/(\d+)/favorites/?$'), get_favorites, ('user', 'favorites', 'people', 'planet'), True),
+]
+
+
+async def is_revoked(session, jti):
+    # Igual que auth.is_revoked(), con la sesión asíncrona
+    revoked = revocation_cache.get(jti)
+    if revoked is None:
+        token = revocation_cache.token()
+        revoked = (await session.execute(
+            select(RevokedToken.jti).where(RevokedToken.jti == jti)
+        )).first() is not None
+        revocation_cache.set(jti, revoked, token)
+    return revoked
+
+
+async def authenticate(session, headers, user_id):
+    """Igual que @token_required + check_user(): devuelve (código, cuerpo) del error o None."""
+    try:
+        token_user_id, jti = decode_token(bearer_token(headers.get(b'authorization', b'').decode('latin-1')), flask_app)
+        check_revoked(await is_revoked(session, jti))
+        check_user(user_id, token_user_id)
+    except APIException as error:
+        return error.status_code, error.to_dict()
+    return None
+
+
+async def get_versions(session, tables):
+    rows = await session.execute(
+        select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables))
+    )
+    versions = dict(rows.all())
+    return [(name, versions.get(name, 0)) for name in tables]
+
+
+def match_route(scope, headers):
+    if scope['method'] != 'GET' or scope['query_string']:
+        return None
+    if b'ndjson' in headers.get(b'accept', b''):
+        return None
+    for pattern, view, tables, auth in ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+            return view, [int(arg) for arg in match.groups()], tables, auth
+    return None
+
+
+async def send_response(send, status, body, headers):
+    headers = headers + [(b'content-length', str(len(body)).encode())]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, payload, headers):
+    response = flask_app.json.response(payload)
+    headers = headers + [(b'content-type', response.mimetype.encode())]
+    await send_response(send, status, response.get_data(), headers)
+
+
+async def check_rate_limit(scope, headers, endpoint):
+    """Igual que check_rate_limit() de ratelimit.py: devuelve (cliente, segundos de espera)."""
+    config = flask_app.config
+    client = client_id(scope['client'][0] if scope.get('client') else None,
+                       headers.get(b'x-forwarded-for', b'').decode('latin-1'), config['PROXY_COUNT'])
+    route_limit = getattr(flask_app.view_functions[endpoint], 'rate_limit', None)
+
+    check = partial(limiter.check, client, endpoint, route_limit)
+    # Con Redis la comprobación es una llamada de red: no debe bloquear el bucle de eventos
+    retry_after = await asyncio.to_thread(check) if limiter.backend.blocking else check()
+    if retry_after is None and not limiter.acquire(client):
+        retry_after = 1
+    return client, retry_after
+
+
+async def handle(scope, send, headers, view, args, tables, auth):
+    response_headers = []
+    if b'origin' in headers:
+        # Lo mismo que añade flask_cors con su configuración por defecto
+        response_headers.append((b'access-control-allow-origin', headers[b'origin']))
+        response_headers.append((b'vary', b'Origin'))
+
+    if not flask_app.config['RATELIMIT_ENABLED']:
+        await respond(scope, send, headers, response_headers, view, args, tables, auth)
+        return
+
+    # Las vistas se llaman igual que los endpoints de Flask, que guardan el límite de cada ruta
+    client, retry_after = await check_rate_limit(scope, headers, view.__name__)
+    if retry_after is not None:
+        payload, retry_after = too_many_requests_body(retry_after)
+        response_headers.append((b'retry-after', retry_after.encode()))
+        await send_json(send, 429, payload, response_headers)
+        return
+    try:
+        await respond(scope, send, headers, response_headers, view, args, tables, auth)
+    finally:
+        limiter.release(client)
+
+
+async def respond(scope, send, headers, response_headers, view, args, tables, auth):
+    path = scope['path']
+    # Mismo full_path que Werkzeug: la ruta seguida siempre de "?"
+    full_path = path + '?'
+    accept = headers.get(b'accept', b'').decode('latin-1')
+
+    async with Session() as session:
+        error = await authenticate(session, headers, *args) if auth else None
+        if error is not None:
+            status, payload = error
+            await send_json(send, status, payload, response_headers)
+            return
+
+        etag = make_etag(await get_versions(session, tables), full_path, accept)
+        matched = matching_etag(parse_etags(headers.get(b'if-none-match', b'').decode('latin-1')), etag)
+        if matched is not None:
+            response_headers.append((b'etag', f'"{matched}"'.encode()))
+            await send_response(send, 304, b'', response_headers)
+            return
+
+        status, payload = await view(session, *args)
+
+    response = flask_app.json.response(payload)
+    body = response.get_data()
+    response_headers.append((b'content-type', response.mimetype.encode()))
+
+    # Misma compresión que setup_compression() en la app de Flask
+    config = flask_app.config
+    if config['COMPRESSION_ENABLED']:
+        response_headers.append((b'vary', b'Accept-Encoding'))
+        encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is not None and len(body) >= config['COMPRESSION_MIN_SIZE']:
+            body = compress(body, encoding, compression_level(config, encoding))
+            response_headers.append((b'content-encoding', encoding.encode()))
+            etag = f'{etag}-{encoding}'
+
+    if status == 200:
+        response_headers.append((b'etag', f'"{etag}"'.encode()))
+    await send_response(send, status, body, response_headers)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http':
+        headers = dict(scope['headers'])
+        route = match_route(scope, headers)
+        if route is not None:
+            await handle(scope, send, headers, *route)
+            return
+
+    await flask_asgi(scope, receive, send)
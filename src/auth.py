@@ -0,0 +1,130 @@
+"""
+Autenticación con tokens firmados (itsdangerous, que ya viene con Flask).
+
+El token lleva el id del usuario y un identificador único (jti), y se verifica
+con la firma y la fecha de emisión, sin consultar la base de datos. Los tokens
+revocados con /logout se guardan en la tabla revoked_token; para no consultarla
+en cada petición, el resultado de cada jti se guarda en una caché en memoria
+(AUTH_REVOCATION_CACHE_TTL segundos). Un logout hecho en otro worker se aplica,
+como mucho, tras ese tiempo.
+
+Los tokens se firman con FLASK_APP_KEY. Sin ella (salvo en modo debug, con una
+clave de ejemplo) no se emiten ni se aceptan tokens: responden 503.
+"""
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import delete, select
+from cache import TTLCache
+from models import db, RevokedToken
+from utils import APIException
+
+revocation_cache = TTLCache()
+
+
+def _serializer(app=None):
+    app = app or current_app
+    if not app.secret_key:
+        raise APIException('Autenticación no disponible: falta configurar FLASK_APP_KEY', status_code=503)
+    return URLSafeTimedSerializer(app.secret_key, salt='auth-token')
+
+
+def create_token(user_id):
+    return _serializer().dumps({'uid': user_id, 'jti': uuid.uuid4().hex})
+
+
+def decode_token(token, app=None):
+    """Devuelve (user_id, jti) si la firma es válida y no ha caducado.
+
+    No comprueba la revocación (ver is_revoked).
+    """
+    app = app or current_app
+    try:
+        data = _serializer(app).loads(token, max_age=app.config['AUTH_TOKEN_TTL'])
+    except SignatureExpired:
+        raise APIException('Token caducado', status_code=401)
+    except BadSignature:
+        raise APIException('Token inválido', status_code=401)
+    return data['uid'], data['jti']
+
+
+def bearer_token(authorization):
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise APIException('Token requerido', status_code=401)
+    return token.strip()
+
+
+def is_revoked(jti):
+    revoked = revocation_cache.get(jti)
+    if revoked is None:
+        token = revocation_cache.token()
+        revoked = db.session.execute(
+            select(RevokedToken.jti).where(RevokedToken.jti == jti)
+        ).first() is not None
+        revocation_cache.set(jti, revoked, token)
+    return revoked
+
+
+def check_revoked(revoked):
+    if revoked:
+        raise APIException('Token revocado', status_code=401)
+
+
+def revoke_token(jti):
+    now = datetime.utcnow()
+    # De paso se borran los tokens revocados que ya han caducado
+    db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+    db.session.add(RevokedToken(
+        jti=jti,
+        expires_at=now + timedelta(seconds=current_app.config['AUTH_TOKEN_TTL'])
+    ))
+    db.session.commit()
+    revocation_cache.set(jti, True)
+
+
+def authenticate():
+    """Valida el token de la cabecera Authorization y deja el usuario en g.user_id."""
+    user_id, jti = decode_token(bearer_token(request.headers.get('Authorization')))
+    check_revoked(is_revoked(jti))
+    g.user_id = user_id
+    g.token_jti = jti
+    return user_id
+
+
+def token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        authenticate()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def check_user(user_id, token_user_id=None):
+    # Rutas con el id del usuario en la URL: solo el propio usuario puede usarlas
+    if token_user_id is None:
+        token_user_id = g.user_id
+    if token_user_id != user_id:
+        raise APIException('No tienes permiso para acceder a este usuario', status_code=403)
+
+
+def owner_required(view):
+    """Solo el propio usuario (<user_id> de la URL) puede usar la ruta.
+
+    Va justo debajo de @token_required y por encima de @read_only y @conditional:
+    así un If-None-Match con el ETag de otro usuario recibe 403, no 304.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        check_user(kwargs['user_id'])
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def setup_auth(app):
+    if not app.secret_key:
+        app.logger.error('FLASK_APP_KEY no está configurada: /login y las rutas con token responden 503')
+    revocation_cache.maxsize = app.config['AUTH_REVOCATION_CACHE_MAXSIZE']
+    revocation_cache.ttl = app.config['AUTH_REVOCATION_CACHE_TTL']
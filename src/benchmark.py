@@ -0,0 +1,484 @@
+"""
+Benchmark de la API: siembra la base de datos con datos de prueba y recorre
+todas las rutas de app.url_map midiendo latencia, peticiones por segundo y
+consultas por petición.
+"""
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event, insert, select, func
+from sqlalchemy.engine import Engine
+from models import db, User, People, Planet, Favorites, recount_favorites, hash_password
+from auth import create_token
+from ratelimit import limiter, RateLimiter
+from search import create_search_index
+from json_provider import orjson
+
+SKIPPED_PREFIXES = ('/admin', '/static')
+CHUNK_SIZE = 1000
+BENCH_PASSWORD = 'bench'
+
+
+def _insert_chunks(model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def seed_database(users, people, planets, favorites_per_user, reset=False, seed=42):
+    rng = random.Random(seed)
+    if reset:
+        db.drop_all()
+        db.create_all()
+        create_search_index(db.session.connection())
+
+    # Los ids nuevos empiezan después de los que ya existen. Todos los usuarios
+    # tienen la contraseña "bench" (se calcula el hash una sola vez)
+    offset = db.session.execute(select(func.count(User.id))).scalar()
+    password = hash_password(BENCH_PASSWORD)
+    _insert_chunks(User, [{
+        'username': f'user{offset + i}',
+        'firstname': 'Bench',
+        'lastname': f'User {offset + i}',
+        'email': f'user{offset + i}@bench.test',
+        'password': password,
+        'is_active': True,
+        'subscription_date': '2024-01-01',
+    } for i in range(users)])
+    _insert_chunks(People, [{
+        'name': f'Character {i}',
+        'gender': rng.choice(['male', 'female', 'n/a']),
+        'species': rng.choice(['human', 'droid', 'wookiee', 'twi\'lek']),
+    } for i in range(people)])
+    _insert_chunks(Planet, [{
+        'name': f'Planet {i}',
+        'climate': rng.choice(['arid', 'temperate', 'frozen', 'murky']),
+        'terrain': rng.choice(['desert', 'grasslands', 'tundra', 'swamp']),
+    } for i in range(planets)])
+    db.session.commit()
+
+    user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()
+    people_ids = db.session.execute(select(People.id)).scalars().all()
+    planet_ids = db.session.execute(select(Planet.id)).scalars().all()
+    existing = set(db.session.execute(select(Favorites.user_id, Favorites.people_id, Favorites.planet_id)).all())
+
+    favorites = []
+    for user_id in user_ids[-users:] if users else []:
+        for _ in range(favorites_per_user):
+            if rng.random() < 0.5 and people_ids:
+                key = (user_id, rng.choice(people_ids), None)
+            elif planet_ids:
+                key = (user_id, None, rng.choice(planet_ids))
+            else:
+                continue
+            if key not in existing:
+                existing.add(key)
+                favorites.append({'user_id': key[0], 'people_id': key[1], 'planet_id': key[2]})
+    _insert_chunks(Favorites, favorites)
+    recount_favorites(People)
+    recount_favorites(Planet)
+    db.session.commit()
+
+    return {
+        'users': len(user_ids),
+        'people': len(people_ids),
+        'planets': len(planet_ids),
+        'favorites': db.session.execute(select(func.count(Favorites.id))).scalar(),
+    }
+
+
+class BenchContext:
+    def __init__(self, app, rng):
+        self.app = app
+        self.rng = rng
+        self.user_ids = db.session.execute(select(User.id)).scalars().all()
+        self.people_ids = db.session.execute(select(People.id)).scalars().all()
+        self.planet_ids = db.session.execute(select(Planet.id)).scalars().all()
+        self.emails = db.session.execute(
+            select(User.email).where(User.email.like('%@bench.test'))
+        ).scalars().all()
+        self.tokens = {}
+        db.session.remove()
+
+    def user_id(self):
+        return self.rng.choice(self.user_ids)
+
+    def people_id(self):
+        return self.rng.choice(self.people_ids)
+
+    def planet_id(self):
+        return self.rng.choice(self.planet_ids)
+
+    def headers(self, user_id):
+        # Un token por usuario, creado sin pasar por /login
+        if user_id not in self.tokens:
+            self.tokens[user_id] = self.new_token(user_id)
+        return {'Authorization': f'Bearer {self.tokens[user_id]}'}
+
+    def new_token(self, user_id):
+        # Contexto propio y breve: las peticiones medidas no deben heredar ninguno
+        with self.app.app_context():
+            return create_token(user_id)
+
+    def email(self):
+        return self.rng.choice(self.emails)
+
+    def pick(self, arg):
+        picker = getattr(self, arg, None)
+        return picker() if picker is not None else None
+
+
+# Escenarios para las rutas que no son un GET simple. Cada uno prepara lo que
+# necesite (sin medir) y devuelve la petición que se mide: (método, url, kwargs).
+
+def _new_person(ctx):
+    return {'name': f'Bench {ctx.rng.random():.6f}', 'gender': 'n/a', 'species': 'droid'}
+
+
+def _new_planet(ctx):
+    return {'name': f'Bench {ctx.rng.random():.6f}', 'climate': 'arid', 'terrain': 'desert'}
+
+
+def _create_character(client, ctx):
+    return 'POST', '/people', {'json': _new_person(ctx)}
+
+
+def _create_planet(client, ctx):
+    return 'POST', '/planet', {'json': _new_planet(ctx)}
+
+
+def _create_characters_bulk(client, ctx):
+    return 'POST', '/people/bulk', {'json': [_new_person(ctx) for _ in range(100)]}
+
+
+def _create_planets_bulk(client, ctx):
+    return 'POST', '/planet/bulk', {'json': [_new_planet(ctx) for _ in range(100)]}
+
+
+def _update_character(client, ctx):
+    return 'PUT', f'/people/{ctx.people_id()}', {'json': {'species': ctx.rng.choice(['human', 'droid'])}}
+
+
+def _update_planet(client, ctx):
+    return 'PUT', f'/planet/{ctx.planet_id()}', {'json': {'climate': ctx.rng.choice(['arid', 'frozen'])}}
+
+
+def _delete_character(client, ctx):
+    people_id = client.post('/people', json=_new_person(ctx)).get_json()['id']
+    return 'DELETE', f'/people/{people_id}', {}
+
+
+def _delete_planet(client, ctx):
+    planet_id = client.post('/planet', json=_new_planet(ctx)).get_json()['id']
+    return 'DELETE', f'/planet/{planet_id}', {}
+
+
+def _favorite_flow(kind, method):
+    def scenario(client, ctx):
+        user_id = ctx.user_id()
+        entity_id = ctx.people_id() if kind == 'people' else ctx.planet_id()
+        url = f'/favorite/{kind}/{entity_id}'
+        kwargs = {'headers': ctx.headers(user_id)}
+        # Se deja el favorito en el estado contrario al que necesita la petición medida
+        client.open(url, method='DELETE' if method == 'POST' else 'POST', **kwargs)
+        return method, url, kwargs
+    return scenario
+
+
+def _batch_favorites(client, ctx):
+    user_id = ctx.user_id()
+    body = {
+        'add': {'people': [ctx.people_id() for _ in range(5)]},
+        'remove': {'planets': [ctx.planet_id() for _ in range(5)]},
+    }
+    return 'POST', f'/users/{user_id}/favorites/batch', {'json': body, 'headers': ctx.headers(user_id)}
+
+
+def _login(client, ctx):
+    return 'POST', '/login', {'json': {'email': ctx.email(), 'password': BENCH_PASSWORD}}
+
+
+def _logout(client, ctx):
+    # Cada petición revoca un token nuevo
+    return 'POST', '/logout', {'headers': {'Authorization': f'Bearer {ctx.new_token(ctx.user_id())}'}}
+
+
+def _search_entities(client, ctx):
+    return 'GET', '/search', {'query_string': {'q': ctx.rng.choice(['char', 'planet 1', 'droid', 'desert'])}}
+
+
+SCENARIOS = {
+    ('create_character', 'POST'): _create_character,
+    ('create_planet', 'POST'): _create_planet,
+    ('create_characters_bulk', 'POST'): _create_characters_bulk,
+    ('create_planets_bulk', 'POST'): _create_planets_bulk,
+    ('update_character', 'PUT'): _update_character,
+    ('update_planet', 'PUT'): _update_planet,
+    ('delete_character', 'DELETE'): _delete_character,
+    ('delete_planet', 'DELETE'): _delete_planet,
+    ('add_favorite_planet', 'POST'): _favorite_flow('planet', 'POST'),
+    ('favorite_people', 'POST'): _favorite_flow('people', 'POST'),
+    ('delete_favorite_planet', 'DELETE'): _favorite_flow('planet', 'DELETE'),
+    ('delete_favorite_people', 'DELETE'): _favorite_flow('people', 'DELETE'),
+    ('batch_favorites', 'POST'): _batch_favorites,
+    ('search_entities', 'GET'): _search_entities,
+    ('login', 'POST'): _login,
+    ('logout', 'POST'): _logout,
+}
+
+
+def _get_scenario(rule):
+    # GET sin escenario propio: se rellenan los parámetros con ids existentes.
+    # La URL se construye sin contexto de petición (ver run_benchmark)
+    def scenario(client, ctx):
+        values = {arg: ctx.pick(arg) for arg in rule.arguments}
+        kwargs = {'headers': ctx.headers(values['user_id'])} if 'user_id' in values else {}
+        return 'GET', ctx.app.url_map.bind('localhost').build(rule.endpoint, values), kwargs
+    if all(hasattr(BenchContext, arg) for arg in rule.arguments):
+        return scenario
+    return None
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, queries, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def route_scenarios(app):
+    """Devuelve [(nombre, escenario)] y la lista de rutas que no se pueden medir."""
+    scenarios = []
+    uncovered = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.rule.startswith(SKIPPED_PREFIXES):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            name = f'{method} {rule.rule}'
+            scenario = SCENARIOS.get((rule.endpoint, method))
+            if scenario is None and method == 'GET':
+                scenario = _get_scenario(rule)
+            if scenario is None:
+                uncovered.append(name)
+            else:
+                scenarios.append((name, scenario))
+    return scenarios, uncovered
+
+
+def run_benchmark(app, requests_per_route=200, warmup=10, only=None, seed=42):
+    """Mide cada ruta con el cliente de pruebas.
+
+    Se llama sin ningún contexto de aplicación activo: cada petición crea el suyo,
+    con su propia sesión y su propio g, y al terminar devuelve la conexión al
+    pool, igual que en producción.
+    """
+    rng = random.Random(seed)
+    client = app.test_client()
+    query_count = [0]
+
+    def count_query(*args):
+        query_count[0] += 1
+
+    with app.app_context():
+        ctx = BenchContext(app, rng)
+
+    scenarios, uncovered = route_scenarios(app)
+    results = {}
+    # Todas las peticiones vienen del mismo cliente: sin límite de peticiones
+    # (su coste se mide aparte, en ratelimit_overhead)
+    ratelimit_enabled = app.config['RATELIMIT_ENABLED']
+    app.config['RATELIMIT_ENABLED'] = False
+    event.listen(Engine, 'before_cursor_execute', count_query)
+    try:
+        for name, scenario in scenarios:
+            if only and only not in name:
+                continue
+            latencies, queries, statuses = [], [], []
+            elapsed = 0.0
+            for i in range(warmup + requests_per_route):
+                method, url, kwargs = scenario(client, ctx)
+                query_count[0] = 0
+                started = time.perf_counter()
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+                duration = time.perf_counter() - started
+                if i < warmup:
+                    continue
+                elapsed += duration
+                latencies.append(duration * 1000)
+                queries.append(query_count[0])
+                statuses.append(response.status_code)
+            results[name] = summarize(latencies, queries, statuses, elapsed)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count_query)
+        app.config['RATELIMIT_ENABLED'] = ratelimit_enabled
+
+    meta = benchmark_meta(app, requests_per_route)
+    meta['ratelimit_overhead_us'] = ratelimit_overhead()
+    return {'meta': meta, 'routes': results, 'uncovered': uncovered}
+
+
+def ratelimit_overhead(n=20000):
+    """Coste medio (µs) que añade el límite de peticiones a cada petición.
+
+    Usa el mismo backend que la app con límites que nunca se alcanzan, y cuenta
+    el bucket general, el de la ruta y el de peticiones simultáneas.
+    """
+    bench_limiter = RateLimiter()
+    bench_limiter.backend = limiter.backend
+    bench_limiter.default_limit = (n, n)
+    bench_limiter.concurrency = max(limiter.concurrency, 1)
+    route_limit = (n, n)
+
+    started = time.perf_counter()
+    for _ in range(n):
+        bench_limiter.check('bench-overhead', 'bench', route_limit)
+        bench_limiter.acquire('bench-overhead')
+        bench_limiter.release('bench-overhead')
+    return round((time.perf_counter() - started) / n * 1e6, 2)
+
+
+def benchmark_meta(app, requests_per_route):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'database': dialect,
+        'requests_per_route': requests_per_route,
+    }
+
+
+def _best_ms(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2)
+
+
+def benchmark_serialization(app, sizes=(10000, 100000), repeat=3):
+    """Tiempo (ms, mejor de `repeat`) de generar el JSON de listas de People.
+
+    En memoria compara serialize() sobre objetos del ORM con la conversión
+    directa de tuplas, con el json estándar y con el proveedor de la app. Con
+    la base de datos compara además cargar objetos frente a cargar tuplas
+    (limitado a las filas que haya en la tabla).
+    """
+    stdlib = DefaultJSONProvider(app)
+    provider = app.json
+    fields = People.serialize_fields
+    compact = {'separators': (',', ':')}
+    results = {}
+
+    for size in sizes:
+        rows = [(i, f'Character {i}', 'n/a', 'droid') for i in range(size)]
+        objects = [People(id=row[0], name=row[1], gender=row[2], species=row[3]) for row in rows]
+        timings = {
+            'orm_serialize_stdlib': _best_ms(lambda: stdlib.dumps([obj.serialize() for obj in objects], **compact), repeat),
+            'tuples_stdlib': _best_ms(lambda: stdlib.dumps([dict(zip(fields, row)) for row in rows], **compact), repeat),
+            'tuples_app_provider': _best_ms(lambda: provider.dumps([dict(zip(fields, row)) for row in rows], **compact), repeat),
+        }
+
+        with app.app_context():
+            columns = [getattr(People, field) for field in fields]
+            timings['db_rows'] = People.query.limit(size).count()
+            timings['db_orm_serialize'] = _best_ms(lambda: provider.dumps(
+                [obj.serialize() for obj in People.query.limit(size).all()], **compact), repeat)
+            timings['db_tuples'] = _best_ms(lambda: provider.dumps(
+                [dict(zip(fields, row)) for row in People.query.with_entities(*columns).limit(size).all()], **compact), repeat)
+            db.session.remove()
+        results[str(size)] = timings
+
+    meta = benchmark_meta(app, None)
+    meta['json_provider'] = 'orjson' if orjson is not None else 'stdlib'
+    return {'meta': meta, 'sizes': results}
+
+
+def compare_results(baseline, current):
+    """Diferencia porcentual de p50/p95/p99 y rps por ruta respecto a la línea base."""
+    rows = []
+    for name, stats in current['routes'].items():
+        base = baseline.get('routes', {}).get(name)
+        if base is None:
+            continue
+        row = {'route': name}
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_per_request'):
+            before, after = base.get(key), stats.get(key)
+            if before:
+                row[key] = round((after - before) / before * 100, 1)
+        rows.append(row)
+    return rows
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+# Se ejecuta en un proceso nuevo para medir el arranque en frío, como un worker
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/people?limit=1')
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'status': response.status_code,
+}))
+"""
+
+STARTUP_VARIANTS = {
+    'full': {'API_ONLY': '0'},
+    'api_only': {'API_ONLY': '1'},
+}
+
+
+def benchmark_startup(runs=5, variants=STARTUP_VARIANTS):
+    """Mediana (ms) de importar app.py y de atender la primera petición, por configuración."""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, variant_env in variants.items():
+        env = dict(os.environ, LOG_LEVEL='WARNING', **variant_env)
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=src_dir, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        results[name] = {
+            'env': variant_env,
+            'import_ms': round(statistics.median(sample['import_ms'] for sample in samples), 1),
+            'first_request_ms': round(statistics.median(sample['first_request_ms'] for sample in samples), 1),
+            'statuses': sorted({sample['status'] for sample in samples}),
+        }
+    return results
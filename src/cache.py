@@ -0,0 +1,158 @@
+"""
+Caché en memoria (LRU con TTL) de los registros serializados de People, Planet y User
+
+Cada registro se guarda con la versión de su tabla (ver versions.py) que leyó
+@conditional en esa petición. Si la versión actual es otra, otro worker escribió
+en la tabla y el registro se vuelve a leer: así el ETag nuevo nunca acompaña a
+un cuerpo anterior a la escritura.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+CACHED_TABLES = ('user', 'people', 'planet')
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def token(self):
+        # Se toma antes de leer de la base de datos y se pasa a set(): si hubo
+        # una invalidación mientras tanto, el valor leído puede estar obsoleto
+        return self.invalidations
+
+    def set(self, key, value, token=None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            if token is not None and token != self.invalidations:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+entity_cache = TTLCache()
+
+
+def cache_key(obj):
+    table = getattr(obj, '__tablename__', None)
+    if table not in CACHED_TABLES or obj.id is None:
+        return None
+    return (table, obj.id)
+
+
+def cached_serialize(model, entity_id, fields=None):
+    """Devuelve model.serialize() para el id indicado, o None si no existe.
+
+    Con fields solo se devuelven esos campos: se toman de la caché si está el
+    registro y, si no, se leen únicamente esas columnas (sin guardar en caché).
+    """
+    key = (model.__tablename__, entity_id)
+    # Versión de la tabla con la que se calculó el ETag (None fuera de @conditional)
+    version = g.get('table_versions', {}).get(model.__tablename__)
+    payload = None
+    cached = entity_cache.get(key)
+    if cached is not None and (version is None or cached[0] == version):
+        payload = cached[1]
+    if fields is not None:
+        if payload is not None:
+            return {field: payload[field] for field in fields}
+        columns = [getattr(model, field) for field in fields]
+        row = model.query.with_entities(*columns).filter(model.id == entity_id).first()
+        return None if row is None else dict(zip(fields, row))
+
+    if payload is None:
+        token = entity_cache.token()
+        entity = model.query.filter_by(id=entity_id).first()
+        if entity is None:
+            return None
+        payload = entity.serialize()
+        entity_cache.set(key, (version, payload), token)
+    return payload
+
+
+# Los eventos de sesión invalidan también los cambios que no pasan por los
+# endpoints (por ejemplo, los que se hacen desde Flask-Admin).
+# Se invalida al hacer flush y otra vez tras el commit, para descartar lo que
+# otra petición haya cacheado entre ambos momentos.
+
+def _after_flush(session, flush_context):
+    keys = session.info.setdefault('cache_keys', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        key = cache_key(obj)
+        if key is not None:
+            entity_cache.invalidate(key)
+            keys.add(key)
+
+
+def _after_commit(session):
+    for key in session.info.pop('cache_keys', ()):
+        entity_cache.invalidate(key)
+
+
+def _after_rollback(session):
+    session.info.pop('cache_keys', None)
+
+
+def setup_cache(app):
+    entity_cache.maxsize = app.config['CACHE_MAXSIZE']
+    entity_cache.ttl = app.config['CACHE_TTL']
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import click
+from benchmark import seed_database, run_benchmark, benchmark_serialization, benchmark_startup, compare_results, save_results
+from models import db, People, Planet, recount_favorites
+from idempotency import purge_expired
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+
+def setup_commands(app):
+
+    # Recalcula desde cero favorite_count de People y Planet a partir de la tabla favorites
+    # (por ejemplo, tras editar favoritos desde Flask-Admin)
+    @app.cli.command('recount-favorites')
+    def recount_favorites_command():
+        people = recount_favorites(People)
+        planets = recount_favorites(Planet)
+        db.session.commit()
+        click.echo(f'Contadores recalculados: {people} personajes, {planets} planetas')
+
+    # Borra las respuestas guardadas por Idempotency-Key que ya caducaron
+    # (conviene programarlo, por ejemplo una vez al día)
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys():
+        click.echo(f'Claves borradas: {purge_expired()}')
+
+    # Siembra la base de datos con datos de prueba, por ejemplo:
+    # $ DATABASE_URL=sqlite:////tmp/bench.db flask seed --reset --people 10000
+    @app.cli.command('seed')
+    @click.option('--users', default=100, show_default=True)
+    @click.option('--people', default=1000, show_default=True)
+    @click.option('--planets', default=500, show_default=True)
+    @click.option('--favorites', default=20, show_default=True, help='Favoritos por usuario')
+    @click.option('--reset', is_flag=True, help='Borra y vuelve a crear todas las tablas')
+    @click.option('--yes', is_flag=True, help='No pedir confirmación al usar --reset')
+    def seed(users, people, planets, favorites, reset, yes):
+        if reset and not yes:
+            click.confirm(f'Se borrarán todos los datos de {app.config["SQLALCHEMY_DATABASE_URI"]}. ¿Continuar?', abort=True)
+        totals = seed_database(users, people, planets, favorites, reset=reset)
+        click.echo(json.dumps(totals))
+
+    # Recorre todas las rutas de app.url_map y guarda los resultados en benchmarks/
+    # $ flask bench --requests 200 --compare benchmarks/baseline.json
+    # Sin el contexto de aplicación del CLI: cada petición medida crea el suyo
+    @app.cli.command('bench', with_appcontext=False)
+    @click.option('--requests', 'requests_per_route', default=200, show_default=True, help='Peticiones medidas por ruta')
+    @click.option('--warmup', default=10, show_default=True)
+    @click.option('--only', default=None, help='Solo rutas que contengan este texto, por ejemplo "GET /people"')
+    @click.option('--output', default=None, help='Fichero JSON de salida (por defecto benchmarks/<commit>.json)')
+    @click.option('--compare', 'baseline_path', default=None, help='Fichero JSON con la línea base a comparar')
+    def bench(requests_per_route, warmup, only, output, baseline_path):
+        if not app.secret_key:
+            raise click.UsageError('Las rutas con token necesitan FLASK_APP_KEY (o FLASK_DEBUG=1)')
+        logging.getLogger('api.requests').setLevel(logging.WARNING)
+        results = run_benchmark(app, requests_per_route=requests_per_route, warmup=warmup, only=only)
+
+        click.echo(f'{"route":45} {"p50":>9} {"p95":>9} {"p99":>9} {"rps":>9} {"queries":>8}')
+        for name, stats in results['routes'].items():
+            click.echo(f'{name:45} {stats["p50_ms"]:>9} {stats["p95_ms"]:>9} {stats["p99_ms"]:>9} '
+                       f'{stats["rps"]:>9} {stats["queries_per_request"]:>8}')
+        click.echo(f'Coste del límite de peticiones: {results["meta"]["ratelimit_overhead_us"]} µs por petición')
+        for name in results['uncovered']:
+            click.echo(f'Sin escenario de benchmark: {name}', err=True)
+
+        if output is None:
+            os.makedirs(BENCHMARK_DIR, exist_ok=True)
+            output = os.path.join(BENCHMARK_DIR, f'{results["meta"]["commit"] or "results"}.json')
+        save_results(results, output)
+        click.echo(f'Resultados guardados en {output}')
+
+        if baseline_path:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            click.echo(f'\nCambio (%) respecto a {baseline_path}:')
+            for row in compare_results(baseline, results):
+                changes = ' '.join(f'{key}={value:+}' for key, value in row.items() if key != 'route')
+                click.echo(f'{row["route"]:45} {changes}')
+
+    # Tiempo de serialización JSON de listados grandes (por defecto 10k y 100k filas)
+    # $ flask bench-json --rows 10000 --rows 100000
+    @app.cli.command('bench-json')
+    @click.option('--rows', multiple=True, type=int, default=(10000, 100000), show_default=True)
+    @click.option('--repeat', default=3, show_default=True)
+    @click.option('--output', default=None, help='Fichero JSON donde guardar los resultados')
+    def bench_json(rows, repeat, output):
+        results = benchmark_serialization(app, sizes=rows, repeat=repeat)
+        click.echo(f'Proveedor JSON de la app: {results["meta"]["json_provider"]}')
+        for size, timings in results['sizes'].items():
+            click.echo(f'\n{size} filas (ms):')
+            for name, value in timings.items():
+                click.echo(f'  {name:24} {value:>10}')
+        if output:
+            save_results(results, output)
+            click.echo(f'Resultados guardados en {output}')
+
+    # Tiempo de arranque de un worker: importar app.py y atender la primera
+    # petición, con todo activado y con API_ONLY=1
+    # $ flask bench-startup --runs 5
+    @app.cli.command('bench-startup')
+    @click.option('--runs', default=5, show_default=True, help='Procesos por configuración (se toma la mediana)')
+    @click.option('--output', default=None, help='Fichero JSON donde guardar los resultados')
+    def bench_startup(runs, output):
+        results = benchmark_startup(runs=runs)
+        click.echo(f'{"config":12} {"import_ms":>10} {"first_request_ms":>17}')
+        for name, stats in results.items():
+            click.echo(f'{name:12} {stats["import_ms"]:>10} {stats["first_request_ms"]:>17}')
+        if output:
+            save_results(results, output)
+            click.echo(f'Resultados guardados en {output}')
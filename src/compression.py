@@ -0,0 +1,89 @@
+"""
+Compresión gzip (y brotli si está instalado) de las respuestas JSON, NDJSON y
+HTML, negociada con la cabecera Accept-Encoding.
+
+Las respuestas normales solo se comprimen a partir de COMPRESSION_MIN_SIZE
+bytes. Las respuestas en streaming se comprimen trozo a trozo (con un flush tras
+cada trozo), así el cliente sigue recibiendo cada lote en cuanto está listo.
+"""
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# En orden de preferencia cuando el cliente acepta varias con la misma calidad
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain')
+
+
+def choose_encoding(accept_encoding):
+    """Codificación a usar según el valor de Accept-Encoding, o None."""
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+def compressor(encoding, level):
+    """Devuelve las funciones (compress, flush, finish) de un compresor incremental."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress(data, encoding, level):
+    compress_chunk, _, finish = compressor(encoding, level)
+    return compress_chunk(data) + finish()
+
+
+def compress_chunks(chunks, encoding, level):
+    compress_chunk, flush, finish = compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compress_chunk(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def compression_level(config, encoding):
+    return config['COMPRESSION_BROTLI_LEVEL'] if encoding == 'br' else config['COMPRESSION_LEVEL']
+
+
+def setup_compression(app):
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config['COMPRESSION_ENABLED'] or request.method == 'HEAD':
+            return response
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        level = compression_level(app.config, encoding)
+
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESSION_MIN_SIZE']:
+                return response
+            response.set_data(compress(data, encoding, level))
+
+        response.headers['Content-Encoding'] = encoding
+        # Cada codificación es una representación distinta: su ETag lleva sufijo
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
@@ -0,0 +1,142 @@
+"""
+Cabecera Idempotency-Key para las altas (POST).
+
+La primera petición con una clave reserva una fila en idempotency_key, se
+ejecuta normalmente y guarda su respuesta. Las repeticiones con la misma clave
+(y la misma petición) devuelven esa respuesta leyendo solo idempotency_key, sin
+volver a validar ni insertar nada. La clave se asocia al endpoint y, en las
+rutas con token, al usuario.
+
+- Misma clave con otra ruta, otro cuerpo u otros parámetros: 422.
+- Misma clave mientras la primera petición sigue en curso: 409.
+- Las respuestas 5xx y las excepciones no se guardan (ni lo que escribió la
+  vista): la clave queda libre para reintentar.
+
+Lo que escribe la vista y su respuesta se guardan en la misma transacción: el
+commit() de la vista solo hace flush y el commit real lo hace el decorador. Si
+el worker muere antes, no queda ni el alta ni la respuesta, y la clave se puede
+volver a usar pasado IDEMPOTENCY_LOCK_TIMEOUT sin duplicar nada.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request, jsonify, make_response, g
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+
+def _sha256(*parts):
+    return hashlib.sha256(b'\n'.join(parts)).hexdigest()
+
+
+def _record_id(key):
+    user_id = g.get('user_id')
+    return _sha256(request.endpoint.encode(), str(user_id or '').encode(), key.encode())
+
+
+def _request_hash():
+    return _sha256(request.method.encode(), request.full_path.encode(), request.get_data())
+
+
+def _error(msg, status_code):
+    return jsonify({'msg': msg}), status_code
+
+
+def _reserve(record_id, request_hash):
+    """Crea la fila pendiente. Devuelve None si se reservó o la fila que ya existía."""
+    now = datetime.utcnow()
+    record = db.session.get(IdempotencyKey, record_id)
+    if record is not None:
+        lock_timeout = timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+        abandoned = record.status_code is None and record.created_at < now - lock_timeout
+        if record.expires_at > now and not abandoned:
+            return record
+        # Caducada, o pendiente de una petición que no terminó: se vuelve a usar
+        db.session.delete(record)
+        db.session.flush()
+
+    db.session.add(IdempotencyKey(
+        id=record_id,
+        request_hash=request_hash,
+        created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición con la misma clave la reservó a la vez
+        db.session.rollback()
+        return db.session.get(IdempotencyKey, record_id)
+    return None
+
+
+def _release(record_id):
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == record_id))
+    db.session.commit()
+
+
+def idempotent(view):
+    """Permite repetir la petición con la misma Idempotency-Key sin repetir el alta.
+
+    Va debajo de @token_required para que la clave quede asociada al usuario.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error(f'Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres', 400)
+
+        record_id = _record_id(key)
+        request_hash = _request_hash()
+        record = _reserve(record_id, request_hash)
+        if record is not None:
+            if record.request_hash != request_hash:
+                return _error('La Idempotency-Key ya se usó con otra petición', 422)
+            if record.status_code is None:
+                response = make_response(_error('Hay una petición con esta Idempotency-Key en curso', 409))
+                response.headers['Retry-After'] = '1'
+                return response
+            response = current_app.response_class(
+                record.response_body, status=record.status_code, mimetype='application/json'
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        # La vista y la respuesta guardada se confirman en un solo commit (abajo)
+        db.session.info['defer_commit'] = True
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.info.pop('defer_commit', None)
+            _release(record_id)
+            raise
+        db.session.info.pop('defer_commit', None)
+
+        if response.status_code >= 500:
+            _release(record_id)
+            return response
+        if response.is_streamed:
+            db.session.commit()
+            _release(record_id)
+            return response
+
+        record = db.session.get(IdempotencyKey, record_id)
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        db.session.commit()
+        return response
+    return wrapper
+
+
+def purge_expired():
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,83 @@
+"""
+Métricas por petición: número de consultas, tiempo en base de datos y tiempo total.
+Se envían en la cabecera Server-Timing y como una línea JSON en el log.
+"""
+import json
+import logging
+import time
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('api.requests')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # El inicio se guarda en el contexto de ejecución, que se descarta con la
+    # sentencia: si la consulta falla no queda nada en la conexión del pool
+    if context is not None:
+        context.query_start = time.perf_counter()
+
+
+def setup_instrumentation(app):
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+    server_timing = app.config['SERVER_TIMING']
+
+    if not logger.handlers and not logging.getLogger().handlers:
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(app.config['LOG_LEVEL'])
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'query_start', None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if has_app_context() and g.get('db_queries') is not None:
+            g.db_queries += 1
+            g.db_time += elapsed_ms
+
+        if slow_query_ms and elapsed_ms >= slow_query_ms:
+            # Los parámetros se recortan: un executemany puede traer miles de filas
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'duration_ms': round(elapsed_ms, 2),
+                'statement': statement,
+                'parameters': repr(parameters)[:1000],
+            }, ensure_ascii=False))
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    @app.after_request
+    def record_request_timing(response):
+        if g.get('request_start') is None:
+            return response
+
+        # En las respuestas en streaming solo se cuenta lo ocurrido antes de
+        # empezar a enviar el cuerpo
+        total_ms = (time.perf_counter() - g.request_start) * 1000
+        if server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={g.db_time:.2f};desc="{g.db_queries} queries", total;dur={total_ms:.2f}'
+            )
+
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': g.db_queries,
+            'db_ms': round(g.db_time, 2),
+            'total_ms': round(total_ms, 2),
+        }))
+        return response
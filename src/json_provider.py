@@ -0,0 +1,37 @@
+"""
+Proveedor JSON de la app: usa orjson cuando está instalado y, si no, el
+proveedor por defecto de Flask (json de la librería estándar).
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Fechas y dataclasses pasan por default() para serializarse igual que con
+    # el proveedor de Flask
+    orjson_options = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if orjson is not None else 0
+    )
+
+    def dumps(self, obj, **kwargs):
+        # orjson siempre genera JSON compacto; solo sabe sangrar con 2 espacios
+        indent = kwargs.get('indent')
+        if orjson is None or set(kwargs) - {'indent', 'separators'} or indent not in (None, 2):
+            return super().dumps(obj, **kwargs)
+
+        option = self.orjson_options
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -1,7 +1,23 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, select, update
+from sqlalchemy.engine import Engine
+from werkzeug.security import generate_password_hash, check_password_hash
+from replicas import RoutingSession
 
-# Inicializamos SQLAlchemy
-db = SQLAlchemy()
+# Inicializamos SQLAlchemy. RoutingSession envía las lecturas de las rutas
+# @read_only a las réplicas, si las hay (ver replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+# SQLite no aplica las claves foráneas (ni ON DELETE CASCADE) si no se activan
+# en cada conexión
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if 'sqlite' in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 
 # Definimos la clase User usando SQLAlchemy
 class User(db.Model):
@@ -11,15 +27,30 @@ class User(db.Model):
     firstname = db.Column(db.String(15), nullable=False)
     lastname = db.Column(db.String(25), nullable=False)
     email = db.Column(db.String(35), unique=True, nullable=False)
-    password = db.Column(db.String(80), nullable=False)
+    # Hash de la contraseña (método$sal$hash de werkzeug), nunca la contraseña en claro
+    password = db.Column(db.String(255), nullable=False)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     subscription_date = db.Column(db.String(25), nullable=False)
 
     favorites = db.relationship('Favorites', backref = 'user')
 
+    # Campos que se pueden pedir con ?fields= (los mismos que devuelve serialize)
+    serialize_fields = ('id', 'username', 'firstname', 'lastname', 'email')
+
     def __repr__(self):
         return f'<User {self.username}>'
 
+    def set_password(self, password):
+        self.password = hash_password(password)
+
+    def check_password(self, password):
+        if not check_password_hash(self.password, password):
+            return False
+        # Si cambió PASSWORD_HASH_METHOD se vuelve a calcular el hash al iniciar sesión
+        if not self.password.startswith(current_app.config['PASSWORD_HASH_METHOD'] + '$'):
+            self.set_password(password)
+        return True
+
     def serialize(self):
         return {
             "id": self.id,
@@ -30,6 +61,28 @@ class User(db.Model):
             # No incluimos el password por razones de seguridad
         }
 
+def hash_password(password):
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+
+# Hash de relleno por método: el login de un email que no existe tarda lo mismo
+# que el de uno registrado
+_dummy_hashes = {}
+
+
+def check_dummy_password(password):
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _dummy_hashes:
+        _dummy_hashes[method] = generate_password_hash('dummy password', method=method)
+    check_password_hash(_dummy_hashes[method], password)
+    return False
+
+
+def is_password_hash(value):
+    method, _, rest = value.partition('$')
+    return method.startswith('pbkdf2:') and rest.count('$') == 1
+
+
 # Definimos la clase Character
 class People(db.Model):
     __tablename__ = 'people'
@@ -37,8 +90,17 @@ class People(db.Model):
     name = db.Column(db.String(25), nullable=False)
     gender = db.Column(db.String(25), nullable=False)
     species = db.Column(db.String(25), nullable=False)
+    # Número de usuarios que lo tienen en favoritos (se mantiene al añadir/eliminar favoritos)
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    favorites = db.relationship('Favorites', backref = 'people')
+    # Los favoritos se borran en la base de datos (ON DELETE CASCADE), sin cargarlos
+    favorites = db.relationship('Favorites', backref = 'people', cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_people_favorite_count', 'favorite_count', 'id'),
+    )
+
+    serialize_fields = ('id', 'name', 'gender', 'species')
 
     def serialize(self):
         return {
@@ -60,8 +122,17 @@ class Planet(db.Model):
     name = db.Column(db.String(25), nullable=False)
     climate = db.Column(db.String(25), nullable=False)
     terrain = db.Column(db.String(30), nullable=False)
+    # Número de usuarios que lo tienen en favoritos (se mantiene al añadir/eliminar favoritos)
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Los favoritos se borran en la base de datos (ON DELETE CASCADE), sin cargarlos
+    favorites = db.relationship('Favorites', backref = 'planet', cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_planet_favorite_count', 'favorite_count', 'id'),
+    )
 
-    favorites = db.relationship('Favorites', backref = 'planet')
+    serialize_fields = ('id', 'name', 'climate', 'terrain')
 
     def serialize(self):
         return {
@@ -77,10 +148,19 @@ class Planet(db.Model):
 # Definimos la clase Favorites, que relaciona a los usuarios con sus personajes y planetas favoritos
 class Favorites(db.Model):
     __tablename__ = 'favorites'
+    # Un usuario no puede repetir un favorito; los índices únicos lo garantizan
+    # en la base de datos y además sirven para buscar los favoritos de un usuario
+    __table_args__ = (
+        db.Index('ix_favorites_user_id', 'user_id'),
+        db.Index('ix_favorites_people_id', 'people_id'),
+        db.Index('ix_favorites_planet_id', 'planet_id'),
+        db.Index('uq_favorites_user_people', 'user_id', 'people_id', unique=True),
+        db.Index('uq_favorites_user_planet', 'user_id', 'planet_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    people_id = db.Column(db.Integer, db.ForeignKey('people.id'))
-    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'))
+    people_id = db.Column(db.Integer, db.ForeignKey('people.id', ondelete='CASCADE'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id', ondelete='CASCADE'))
 
 
     def serialize(self):
@@ -94,3 +174,64 @@ class Favorites(db.Model):
     def __repr__(self):
         return f'<Favorites {self.id}>'
 
+
+# Contadores de favoritos de People y Planet. No cambian lo que devuelve
+# serialize(), por eso no incrementan la versión de la tabla (ver versions.py).
+
+def favorite_column(model):
+    return Favorites.people_id if model is People else Favorites.planet_id
+
+def change_favorite_count(model, entity_id, delta):
+    db.session.execute(
+        update(model)
+        .where(model.id == entity_id)
+        .values(favorite_count=model.favorite_count + delta)
+        .execution_options(synchronize_session=False, skip_table_version=True)
+    )
+
+def recount_favorites(model, ids=None):
+    # Recalcula los contadores desde la tabla favorites (todos o solo los ids indicados)
+    column = favorite_column(model)
+    count = select(func.count(Favorites.id)).where(column == model.id).scalar_subquery()
+    statement = update(model).values(favorite_count=count)
+    if ids is not None:
+        statement = statement.where(model.id.in_(ids))
+    return db.session.execute(
+        statement.execution_options(synchronize_session=False, skip_table_version=True)
+    ).rowcount
+
+
+# Versión de cada tabla: se incrementa con cada escritura y se usa para los ETag
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(25), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name} {self.version}>'
+
+
+# Tokens revocados con /logout. Se pueden borrar cuando pasa expires_at, porque
+# a partir de entonces el token ya no es válido de todas formas.
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_token'
+    jti = db.Column(db.String(32), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
+
+
+# Respuestas guardadas de las peticiones POST con cabecera Idempotency-Key (ver
+# idempotency.py). status_code es NULL mientras la primera petición está en curso.
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    id = db.Column(db.String(64), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.id}>'
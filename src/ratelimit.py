@@ -0,0 +1,255 @@
+"""
+Límite de peticiones por cliente y por ruta (token bucket) y máximo de
+peticiones simultáneas por cliente.
+
+Cada cliente (su IP) tiene un bucket general (RATELIMIT_DEFAULT) y otro por cada
+ruta decorada con @limit(). Los límites se escriben como "60/minute": 60 es
+también la ráfaga máxima. El estado se guarda en la memoria del proceso; con
+RATELIMIT_STORAGE_URL=redis://... se comparte entre workers y nodos. El máximo
+de peticiones simultáneas (RATELIMIT_CONCURRENCY) es siempre por proceso.
+
+Detrás de un proxy o balanceador (Render, Heroku...) remote_addr es la IP del
+proxy y todos los clientes compartirían el mismo bucket: hay que indicar cuántos
+proxies hay delante con PROXY_COUNT (ProxyFix de werkzeug). Solo se usa la IP
+que añadió el último de esos proxies, nunca las entradas de X-Forwarded-For que
+puede escribir el propio cliente. Por eso el límite solo está activo por defecto
+con PROXY_COUNT; si se activa con RATELIMIT_ENABLED=1 sin PROXY_COUNT y llegan
+cabeceras X-Forwarded-For, se avisa en el log (una vez por proceso).
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request, jsonify, g
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(value):
+    """'60/minute' -> (capacidad, tokens por segundo), o None si value está vacío."""
+    if not value:
+        return None
+    count, _, unit = value.partition('/')
+    unit = unit.strip().rstrip('s')
+    if unit not in UNITS:
+        raise ValueError(f'Límite inválido: {value!r} (por ejemplo "60/minute")')
+    count = int(count)
+    return count, count / UNITS[unit]
+
+
+class MemoryBackend:
+    # Buckets en un diccionario del proceso (LRU: los clientes inactivos se descartan)
+    blocking = False
+
+    def __init__(self, url=None, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """Gasta un token del bucket. Devuelve (permitido, segundos hasta el siguiente token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+# Mismo algoritmo que MemoryBackend, ejecutado de forma atómica en Redis y con
+# la hora del servidor de Redis (igual para todos los workers)
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    blocking = True
+
+    def __init__(self, url, maxsize=None):
+        if redis is None:
+            raise RuntimeError('RATELIMIT_STORAGE_URL=redis://... necesita el paquete redis')
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, capacity, rate):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'], args=[capacity, rate])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+
+STORAGE_BACKENDS = {
+    'memory': MemoryBackend,
+    'redis': RedisBackend,
+    'rediss': RedisBackend,
+}
+
+
+class RateLimiter:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.default_limit = None
+        self.concurrency = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.concurrency_limited = 0
+        self.limited_by_endpoint = {}
+        self.proxy_warned = False
+
+    def check(self, client, endpoint, route_limit=None):
+        """Devuelve None si la petición puede pasar, o los segundos que debe esperar."""
+        limits = []
+        if route_limit is not None:
+            limits.append((f'{client}:{endpoint}', route_limit))
+        if self.default_limit is not None:
+            limits.append((client, self.default_limit))
+
+        for key, (capacity, rate) in limits:
+            allowed, retry_after = self.backend.consume(key, capacity, rate)
+            if not allowed:
+                with self._lock:
+                    self.limited += 1
+                    self.limited_by_endpoint[endpoint] = self.limited_by_endpoint.get(endpoint, 0) + 1
+                return retry_after
+        with self._lock:
+            self.allowed += 1
+        return None
+
+    def acquire(self, client):
+        # Reserva una de las peticiones simultáneas del cliente (siempre en este proceso)
+        if self.concurrency <= 0:
+            return True
+        with self._lock:
+            in_flight = self._in_flight.get(client, 0)
+            if in_flight >= self.concurrency:
+                self.concurrency_limited += 1
+                return False
+            self._in_flight[client] = in_flight + 1
+            return True
+
+    def release(self, client):
+        if self.concurrency <= 0:
+            return
+        with self._lock:
+            in_flight = self._in_flight.get(client, 0) - 1
+            if in_flight > 0:
+                self._in_flight[client] = in_flight
+            else:
+                self._in_flight.pop(client, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': type(self.backend).__name__,
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'concurrency_limited': self.concurrency_limited,
+                'limited_by_endpoint': dict(self.limited_by_endpoint),
+                'in_flight_clients': len(self._in_flight),
+            }
+
+
+limiter = RateLimiter()
+
+
+def limit(value):
+    """Límite propio de la ruta, además del general. Va justo debajo de @app.route."""
+    route_limit = parse_limit(value)
+
+    def decorator(view):
+        view.rate_limit = route_limit
+        return view
+    return decorator
+
+
+def exempt(view):
+    # Rutas que no cuentan para ningún límite (sitemap, health checks...)
+    view.rate_limit_exempt = True
+    return view
+
+
+def client_id(remote_addr, forwarded_for=None, proxy_count=0):
+    # Igual que ProxyFix(x_for=proxy_count): la IP que añadió el proxy más lejano
+    # de los nuestros. Las entradas anteriores las controla el cliente
+    if proxy_count and forwarded_for:
+        values = [value.strip() for value in forwarded_for.split(',')]
+        if len(values) >= proxy_count:
+            return values[-proxy_count]
+    return remote_addr or 'unknown'
+
+
+def too_many_requests_body(retry_after):
+    # (cuerpo, valor de Retry-After en segundos enteros) de la respuesta 429
+    return {'msg': 'Demasiadas peticiones, inténtalo más tarde'}, str(max(1, math.ceil(retry_after)))
+
+
+def too_many_requests(retry_after):
+    body, retry_after = too_many_requests_body(retry_after)
+    response = jsonify(body)
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after
+    return response
+
+
+def setup_ratelimit(app):
+    storage_url = app.config['RATELIMIT_STORAGE_URL']
+    backend = STORAGE_BACKENDS[storage_url.split('://', 1)[0]]
+    limiter.backend = backend(storage_url, maxsize=app.config['RATELIMIT_MAX_CLIENTS'])
+    limiter.default_limit = parse_limit(app.config['RATELIMIT_DEFAULT'])
+    limiter.concurrency = app.config['RATELIMIT_CONCURRENCY']
+
+    @app.before_request
+    def check_rate_limit():
+        if not app.config['RATELIMIT_ENABLED'] or request.method == 'OPTIONS':
+            return None
+        view = app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, 'rate_limit_exempt', False):
+            return None
+
+        # Con PROXY_COUNT, remote_addr ya es la IP del cliente (ProxyFix en app.py)
+        if not app.config['PROXY_COUNT'] and not limiter.proxy_warned and 'X-Forwarded-For' in request.headers:
+            limiter.proxy_warned = True
+            app.logger.warning('Llegan cabeceras X-Forwarded-For con PROXY_COUNT=0: todos los '
+                               'clientes detrás del proxy comparten el mismo límite de peticiones')
+        client = client_id(request.remote_addr)
+        retry_after = limiter.check(client, request.endpoint, getattr(view, 'rate_limit', None))
+        if retry_after is not None:
+            return too_many_requests(retry_after)
+        if not limiter.acquire(client):
+            return too_many_requests(1)
+        g.rate_limit_client = client
+        return None
+
+    @app.teardown_request
+    def release_rate_limit(exception):
+        client = g.pop('rate_limit_client', None)
+        if client is not None:
+            limiter.release(client)
@@ -0,0 +1,164 @@
+"""
+Réplicas de lectura (opcional): DATABASE_REPLICA_URLS=url1,url2,...
+
+Las rutas marcadas con @read_only leen de una réplica, elegida por turnos para
+cada petición; todo lo demás, y cualquier escritura, va a la base de datos
+principal (DATABASE_URL).
+
+- Leer lo que uno acaba de escribir: tras una escritura con éxito la respuesta
+  lleva la cookie read_primary durante REPLICA_STICKY_SECONDS, y mientras tanto
+  las lecturas de ese cliente van a la principal.
+- Si una réplica falla, se marca como caída durante REPLICA_RETRY_SECONDS y la
+  petición se repite en la principal.
+
+Para probarlo en local basta con copias de la base de datos SQLite:
+
+    $ cp /tmp/test.db /tmp/replica1.db && cp /tmp/test.db /tmp/replica2.db
+    $ DATABASE_REPLICA_URLS=sqlite:////tmp/replica1.db,sqlite:////tmp/replica2.db flask run
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_COOKIE = 'read_primary'
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def healthy(self):
+        return self.down_until <= time.monotonic()
+
+
+class ReplicaSet:
+    def __init__(self):
+        self.replicas = []
+        self.retry_seconds = 30
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def configure(self, engines, retry_seconds):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.retry_seconds = retry_seconds
+        self._cycle = itertools.cycle(self.replicas)
+
+    def choose(self):
+        """Siguiente réplica disponible (por turnos), o None si no hay ninguna."""
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    return replica
+        return None
+
+    def mark_down(self, replica):
+        with self._lock:
+            replica.failures += 1
+            replica.down_until = time.monotonic() + self.retry_seconds
+
+    def status(self):
+        return [{
+            'url': replica.engine.url.render_as_string(hide_password=True),
+            'healthy': replica.healthy,
+            'failures': replica.failures,
+        } for replica in self.replicas]
+
+
+replicas = ReplicaSet()
+
+
+class RoutingSession(Session):
+    """Sesión de Flask-SQLAlchemy que envía las lecturas a la réplica de la petición.
+
+    La réplica la fija @read_only en session.info['replica']; las escrituras y los
+    flush van siempre a la base de datos principal. Con session.info['defer_commit']
+    (@idempotent) commit() se queda en un flush.
+    """
+
+    def commit(self):
+        # @idempotent hace el commit de la vista junto con la respuesta guardada
+        # (ver idempotency.py): mientras tanto, commit() solo hace flush
+        if self.info.get('defer_commit'):
+            self.flush()
+            return
+        super().commit()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            return replica.engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """La vista solo lee: se atiende desde una réplica si hay alguna disponible.
+
+    La réplica se mantiene hasta el final de la petición (también al enviar una
+    respuesta en streaming).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replica = None
+        if replicas.replicas and not request.cookies.get(PRIMARY_COOKIE):
+            replica = replicas.choose()
+        if replica is None:
+            return view(*args, **kwargs)
+
+        session = current_app.extensions['sqlalchemy'].session
+        session.info['replica'] = replica
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError:
+            # Réplica caída, que no responde o sin el esquema al día: se repite
+            # la petición en la principal
+            session.rollback()
+            session.info.pop('replica', None)
+            replicas.mark_down(replica)
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def replica_engine_options(url, options):
+    if url.startswith('sqlite'):
+        return {'pool_pre_ping': options.get('pool_pre_ping', True)}
+    return options
+
+
+def configure_replicas(app):
+    # Crea los motores de DATABASE_REPLICA_URLS (también la usan los tests)
+    for replica in replicas.replicas:
+        replica.engine.dispose()
+    urls = [url.strip().replace('postgres://', 'postgresql://')
+            for url in app.config['DATABASE_REPLICA_URLS'].split(',') if url.strip()]
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    replicas.configure(
+        [create_engine(url, **replica_engine_options(url, options)) for url in urls],
+        app.config['REPLICA_RETRY_SECONDS']
+    )
+
+
+def setup_replicas(app):
+    configure_replicas(app)
+
+    @app.teardown_request
+    def release_replica(exception):
+        if replicas.replicas:
+            app.extensions['sqlalchemy'].session.info.pop('replica', None)
+
+    @app.after_request
+    def stick_to_primary(response):
+        # Tras escribir, este cliente lee de la principal hasta que las réplicas se pongan al día
+        if replicas.replicas and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=app.config['REPLICA_STICKY_SECONDS'],
+                                httponly=True, samesite='Lax')
+        return response
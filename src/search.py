@@ -0,0 +1,120 @@
+"""
+Búsqueda por texto (con prefijos) sobre People (name, species) y Planet (name,
+climate, terrain). Usa índices de la base de datos: tsvector + GIN en PostgreSQL
+y tablas FTS5 en SQLite. Los índices se crean en la migración de búsqueda o con
+create_search_index() cuando las tablas se crean con db.create_all(); una base
+de datos SQLite sin tablas FTS5 busca por prefijo con LIKE, sin ranking.
+"""
+import re
+from sqlalchemy import select, text, or_
+from models import db, People, Planet
+
+SEARCH_FIELDS = {
+    'people': ('name', 'species'),
+    'planet': ('name', 'climate', 'terrain'),
+}
+MAX_TERMS = 8
+
+
+def search_terms(query):
+    # Solo letras y números: el resto no debe llegar a la sintaxis de tsquery/FTS5
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _tsvector(table, qualified=True):
+    # Debe coincidir con la expresión del índice GIN de la migración
+    prefix = f'{table}.' if qualified else ''
+    fields = " || ' ' || ".join(f"coalesce({prefix}{field}, '')" for field in SEARCH_FIELDS[table])
+    return f"to_tsvector('simple', {fields})"
+
+
+def _search_postgresql(model, terms, limit, offset):
+    table = model.__tablename__
+    vector = _tsvector(table)
+    sql = text(
+        f"SELECT {table}.* FROM {table}, to_tsquery('simple', :query) AS query "
+        f"WHERE {vector} @@ query "
+        f"ORDER BY ts_rank({vector}, query) DESC, {table}.id "
+        f"LIMIT :limit OFFSET :offset"
+    )
+    query = ' & '.join(f'{term}:*' for term in terms)
+    return select(model).from_statement(sql), {'query': query, 'limit': limit, 'offset': offset}
+
+
+def _has_fts_table(table):
+    # Una consulta a sqlite_master: en SQLite es local y no cuesta nada
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': f'{table}_fts'}
+    ).first() is not None
+
+
+def _search_sqlite(model, terms, limit, offset):
+    table = model.__tablename__
+    if not _has_fts_table(table):
+        return _search_like(model, terms, limit, offset)
+    sql = text(
+        f"SELECT {table}.* FROM {table}_fts JOIN {table} ON {table}.id = {table}_fts.rowid "
+        f"WHERE {table}_fts MATCH :query "
+        f"ORDER BY bm25({table}_fts), {table}.id "
+        f"LIMIT :limit OFFSET :offset"
+    )
+    query = ' AND '.join(f'"{term}"*' for term in terms)
+    return select(model).from_statement(sql), {'query': query, 'limit': limit, 'offset': offset}
+
+
+def _search_like(model, terms, limit, offset):
+    # Otras bases de datos: sin índice de texto, solo coincidencia por prefijo
+    columns = [getattr(model, field) for field in SEARCH_FIELDS[model.__tablename__]]
+    statement = select(model)
+    for term in terms:
+        statement = statement.where(or_(*[column.ilike(f'{term}%') for column in columns]))
+    return statement.order_by(model.id).limit(limit).offset(offset), {}
+
+
+SEARCH_BACKENDS = {
+    'postgresql': _search_postgresql,
+    'sqlite': _search_sqlite,
+}
+
+
+def search(model, query, limit, offset=0):
+    terms = search_terms(query)
+    if not terms:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    backend = SEARCH_BACKENDS.get(dialect, _search_like)
+    statement, params = backend(model, terms, limit, offset)
+    return db.session.execute(statement, params).scalars().all()
+
+
+def create_search_index(connection):
+    """Crea (o recrea) los índices de búsqueda para la base de datos de la conexión."""
+    dialect = connection.dialect.name
+    for model in (People, Planet):
+        table = model.__tablename__
+        fields = SEARCH_FIELDS[table]
+        if dialect == 'postgresql':
+            connection.execute(text(f'DROP INDEX IF EXISTS ix_{table}_search'))
+            connection.execute(text(f'CREATE INDEX ix_{table}_search ON {table} USING gin ({_tsvector(table, qualified=False)})'))
+        elif dialect == 'sqlite':
+            for statement in sqlite_search_ddl(table, fields):
+                connection.execute(text(statement))
+
+
+def sqlite_search_ddl(table, fields):
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    return [
+        f'DROP TABLE IF EXISTS {table}_fts',
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5({columns}, content='{table}', content_rowid='id', prefix='2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {columns} ON {table} BEGIN '
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {table}_fts(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
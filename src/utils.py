@@ -1,4 +1,7 @@
-from flask import jsonify, url_for
+import base64
+import binascii
+import hashlib
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +18,140 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def missing_fields(body, fields):
+    # Campos obligatorios que faltan o vienen vacíos en el cuerpo de la petición
+    if not isinstance(body, dict):
+        return list(fields)
+    return [field for field in fields if not body.get(field)]
+
+def encode_cursor(last_id):
+    # El cursor es opaco para el cliente: solo codifica el último id devuelto
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise APIException('Cursor inválido', status_code=400)
+
+def get_int_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise APIException(f'El parámetro {name} debe ser un entero', status_code=400)
+
+def get_page_args():
+    """Devuelve (limit, after_id) si la petición pide paginar, o None si no."""
+    if not any(name in request.args for name in ('limit', 'after_id', 'cursor')):
+        return None
+
+    limit = get_int_arg('limit')
+    if limit is None:
+        limit = current_app.config['PAGINATION_DEFAULT_LIMIT']
+    if limit < 1:
+        raise APIException('El parámetro limit debe ser mayor que 0', status_code=400)
+    limit = min(limit, current_app.config['PAGINATION_MAX_LIMIT'])
+
+    cursor = request.args.get('cursor')
+    after_id = decode_cursor(cursor) if cursor else get_int_arg('after_id')
+    return limit, after_id
+
+def paginate_keyset(query, model, limit, after_id=None):
+    # Paginación por clave: busca sobre el índice de la primary key, sin OFFSET.
+    # Se pide una fila de más para saber si existe una página siguiente.
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    rows = query.order_by(model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+def get_fields(model):
+    """Campos pedidos con ?fields=id,name (en orden y sin repetir), o None si no se pidió."""
+    value = request.args.get('fields')
+    if value is None:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in model.serialize_fields]
+    if not fields or unknown:
+        raise APIException(
+            'Campos no válidos: ' + ', '.join(unknown or [value]),
+            status_code=400,
+            payload={'allowed_fields': list(model.serialize_fields)}
+        )
+    return fields
+
+def get_include(sections):
+    """Secciones pedidas con ?include=user,counts, o todas si no se indica."""
+    value = request.args.get('include')
+    if value is None:
+        return set(sections)
+    include = {section.strip() for section in value.split(',') if section.strip()}
+    unknown = sorted(include - set(sections))
+    if not include or unknown:
+        raise APIException(
+            'Secciones no válidas: ' + ', '.join(unknown or [value]),
+            status_code=400,
+            payload={'allowed_sections': list(sections)}
+        )
+    return include
+
+def list_query(model, fields=None):
+    """Consulta y función de serialización para un listado.
+
+    Se seleccionan solo las columnas pedidas (todas las de serialize() si no se
+    indica fields), más el id que hace falta para paginar, y las tuplas se
+    convierten directamente en diccionarios, sin crear objetos del ORM.
+    """
+    if fields is None:
+        fields = model.serialize_fields
+    columns = [getattr(model, field) for field in fields]
+    if 'id' not in fields:
+        columns.append(model.id)
+    return model.query.with_entities(*columns), lambda row: dict(zip(fields, row))
+
+def wants_stream():
+    # Modo streaming con ?stream=1 o con Accept: application/x-ndjson
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+def stream_ndjson(query, serialize):
+    """Envía el resultado de la consulta como NDJSON (un objeto por línea).
+
+    Las filas se leen de la base de datos en lotes con yield_per y cada lote se
+    envía en cuanto está listo, así la memoria no crece con el tamaño de la tabla.
+    """
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    dumps = current_app.json.dumps
+
+    def generate():
+        lines = []
+        for row in query.yield_per(batch_size):
+            lines.append(dumps(serialize(row)))
+            if len(lines) >= batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin.index' in app.view_functions else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -39,3 +169,15 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+
+def cached_sitemap(app):
+    """Devuelve (html, etag) del sitemap, generado en la primera petición.
+
+    No hace falta comprobar si cambian las rutas: Flask no permite añadirlas
+    después de atender la primera petición.
+    """
+    cached = app.extensions.get('sitemap')
+    if cached is None:
+        html = generate_sitemap(app)
+        cached = app.extensions['sitemap'] = {'html': html, 'etag': hashlib.sha1(html.encode()).hexdigest()}
+    return cached['html'], cached['etag']
@@ -0,0 +1,141 @@
+"""
+Versión por tabla para responder GET condicionales (ETag / If-None-Match)
+sin cargar ni serializar filas
+"""
+import hashlib
+from functools import wraps
+from flask import request, make_response, g
+from sqlalchemy import event, insert, update, select
+from sqlalchemy.orm import Session
+from models import db, TableVersion
+from compression import ENCODINGS
+
+VERSIONED_TABLES = ('user', 'people', 'planet', 'favorites')
+# Tablas cuyas filas borra la base de datos (ON DELETE CASCADE) al borrar en otra
+CASCADED_DELETES = {'people': ('favorites',), 'planet': ('favorites',)}
+
+
+def bump_versions(connection, tables):
+    table = TableVersion.__table__
+    for name in sorted(tables):
+        result = connection.execute(
+            update(table).where(table.c.name == name).values(version=table.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(name=name, version=1))
+
+
+def get_versions(tables):
+    rows = db.session.execute(
+        select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables))
+    )
+    versions = dict(rows.all())
+    return [(name, versions.get(name, 0)) for name in tables]
+
+
+def make_etag(versions, full_path, accept):
+    key = ';'.join(f'{name}:{version}' for name, version in versions)
+    key += '|' + full_path + '|' + accept
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def matching_etag(if_none_match, etag):
+    """Variante de etag presente en If-None-Match, o None.
+
+    Las respuestas comprimidas llevan el ETag con el sufijo de su codificación
+    (ver compression.py), y el cliente lo devuelve tal cual.
+    """
+    for tag in (etag,) + tuple(f'{etag}-{encoding}' for encoding in ENCODINGS):
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def conditional(*tables):
+    """Añade un ETag fuerte a las respuestas 200 y contesta 304 si no cambió.
+
+    El ETag depende solo de las versiones de las tablas indicadas, de la URL
+    (con sus parámetros) y del Accept, así que se calcula con una consulta por
+    clave primaria antes de ejecutar la vista.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(tables)
+            # cached_serialize solo usa registros de la caché con estas versiones
+            g.table_versions = dict(versions)
+            etag = make_etag(versions, request.full_path, request.headers.get('Accept', ''))
+
+            matched = matching_etag(request.if_none_match, etag)
+            if matched is not None:
+                response = make_response('', 304)
+                response.set_etag(matched)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+
+# Las versiones se incrementan en la misma transacción que la escritura: los
+# cambios hechos con objetos del ORM se detectan en el flush y las sentencias
+# insert/update/delete ejecutadas con session.execute en do_orm_execute (salvo
+# las que llevan skip_table_version porque no cambian ninguna respuesta).
+# Así también cuentan las escrituras hechas desde Flask-Admin.
+#
+# Incrementar la fila de table_version la bloquea hasta el commit, y en
+# PostgreSQL eso serializa todas las escrituras en la misma tabla. Para que el
+# bloqueo dure lo menos posible, las tablas se apuntan en session.info y el
+# UPDATE se hace justo antes del commit, ya sin más trabajo en la transacción.
+# No se usa una secuencia ni max(updated_at): una secuencia avanza antes del
+# commit (y el ETag nuevo podría acompañar a datos viejos) y los borrados no
+# cambian max(updated_at).
+
+def _pending_tables(session):
+    return session.info.setdefault('version_tables', set())
+
+
+def _after_flush(session, flush_context):
+    tables = _pending_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = getattr(obj, '__tablename__', None)
+        if name in VERSIONED_TABLES:
+            tables.add(name)
+    for obj in session.deleted:
+        tables.update(CASCADED_DELETES.get(getattr(obj, '__tablename__', None), ()))
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get('skip_table_version'):
+        return
+    name = orm_execute_state.statement.table.name
+    tables = _pending_tables(orm_execute_state.session)
+    if name in VERSIONED_TABLES:
+        tables.add(name)
+    if orm_execute_state.is_delete:
+        tables.update(CASCADED_DELETES.get(name, ()))
+
+
+def _before_commit(session):
+    # El flush del commit podría apuntar más tablas: se hace antes
+    session.flush()
+    tables = session.info.pop('version_tables', None)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+def _after_rollback(session):
+    session.info.pop('version_tables', None)
+
+
+def setup_versions(app):
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'do_orm_execute', _do_orm_execute)
+        event.listen(Session, 'before_commit', _before_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, insert
+
+# La aplicación lee la configuración al importarse: base de datos SQLite
+# temporal, clave para los tokens y sin límite de peticiones
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['FLASK_APP_KEY'] = 'test key'
+os.environ['RATELIMIT_ENABLED'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import app as flask_app  # noqa: E402
+from auth import create_token, revocation_cache  # noqa: E402
+from cache import entity_cache  # noqa: E402
+from models import db, User, People  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    entity_cache.clear()
+    revocation_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+
+def add_users(n, prefix='user'):
+    """Crea n usuarios con un solo INSERT y devuelve sus ids."""
+    rows = [{
+        'username': f'{prefix}{i}',
+        'firstname': 'Test',
+        'lastname': 'User',
+        'email': f'{prefix}{i}@example.com',
+        # No se inicia sesión con contraseña: los tokens se crean con create_token
+        'password': 'x',
+        'is_active': True,
+        'subscription_date': '2024-01-01',
+    } for i in range(n)]
+    db.session.execute(insert(User), rows)
+    db.session.commit()
+    return [user.id for user in User.query.filter(User.username.like(f'{prefix}%')).order_by(User.id)]
+
+
+def add_people(n, prefix='Person'):
+    db.session.execute(insert(People), [
+        {'name': f'{prefix} {i}', 'gender': 'n/a', 'species': 'human'} for i in range(n)
+    ])
+    db.session.commit()
+    return [person.id for person in People.query.filter(People.name.like(f'{prefix} %')).order_by(People.id)]
+
+
+def auth_headers(user_id):
+    return {'Authorization': f'Bearer {create_token(user_id)}'}
@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import add_users, auth_headers
+from models import db, User
+
+
+@pytest.mark.parametrize('path', ['/users/{}/favorites', '/users/{}/profile'])
+def test_other_user_etag_gets_403_not_304(client, path):
+    user_id, other_id = add_users(2)
+    url = path.format(other_id)
+    etag = client.get(url, headers=auth_headers(other_id)).headers['ETag']
+
+    response = client.get(url, headers={**auth_headers(user_id), 'If-None-Match': etag})
+    assert response.status_code == 403
+    # El dueño sí recibe el 304
+    assert client.get(url, headers={**auth_headers(other_id), 'If-None-Match': etag}).status_code == 304
+
+
+def test_missing_or_invalid_token_is_401(client):
+    user_id, = add_users(1)
+    url = f'/users/{user_id}/favorites'
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
+    assert client.get(url, headers={'Authorization': 'Basic abc'}).status_code == 401
+
+
+def test_expired_token_is_401(app, client, monkeypatch):
+    user_id, = add_users(1)
+    headers = auth_headers(user_id)
+    monkeypatch.setitem(app.config, 'AUTH_TOKEN_TTL', -1)
+    response = client.get(f'/users/{user_id}/favorites', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Token caducado'
+
+
+def test_token_rejected_after_logout(client):
+    user_id, = add_users(1)
+    headers = auth_headers(user_id)
+    url = f'/users/{user_id}/favorites'
+    assert client.get(url, headers=headers).status_code == 200
+
+    assert client.post('/logout', headers=headers).status_code == 200
+    response = client.get(url, headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Token revocado'
+
+
+@pytest.fixture
+def login_user(app, monkeypatch):
+    # Hash barato para que los tests no tarden
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    user_id, = add_users(1)
+    user = db.session.get(User, user_id)
+    user.set_password('secret')
+    db.session.commit()
+    return user
+
+
+def login(client, email, password):
+    return client.post('/login', json={'email': email, 'password': password})
+
+
+def test_login_returns_working_token(client, login_user):
+    response = login(client, login_user.email, 'secret')
+    assert response.status_code == 200
+    headers = {'Authorization': f'Bearer {response.get_json()["token"]}'}
+    assert client.get(f'/users/{login_user.id}/favorites', headers=headers).status_code == 200
+
+
+def test_login_wrong_password_or_unknown_email_is_401(client, login_user):
+    wrong_password = login(client, login_user.email, 'wrong')
+    unknown_email = login(client, 'nobody@example.com', 'secret')
+    assert wrong_password.status_code == unknown_email.status_code == 401
+    # Mismo mensaje: no se revela si el email existe
+    assert wrong_password.get_json() == unknown_email.get_json()
+
+
+def test_login_rehashes_password_with_new_method(app, client, login_user, monkeypatch):
+    assert login_user.password.startswith('pbkdf2:sha256:1000$')
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+
+    assert login(client, login_user.email, 'secret').status_code == 200
+    db.session.expire_all()
+    user = db.session.get(User, login_user.id)
+    assert user.password.startswith('pbkdf2:sha256:2000$')
+    assert user.check_password('secret')
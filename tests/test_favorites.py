@@ -0,0 +1,106 @@
+from sqlalchemy import func, insert, select
+
+from conftest import add_people, add_users, auth_headers
+from models import db, Favorites, People, Planet
+
+
+def add_favorites(user_id, n, prefix):
+    # n personajes y n planetas favoritos del usuario
+    people_ids = add_people(n, prefix)
+    db.session.execute(insert(Planet), [
+        {'name': f'{prefix} planet {i}', 'climate': 'arid', 'terrain': 'desert'} for i in range(n)
+    ])
+    planet_ids = [planet.id for planet in Planet.query.filter(Planet.name.like(f'{prefix} planet %'))]
+    db.session.execute(insert(Favorites), [
+        {'user_id': user_id, 'people_id': people_id} for people_id in people_ids
+    ])
+    db.session.execute(insert(Favorites), [
+        {'user_id': user_id, 'planet_id': planet_id} for planet_id in planet_ids
+    ])
+    db.session.commit()
+
+
+def favorites_queries(client, count_queries, user_id):
+    headers = auth_headers(user_id)
+    with count_queries() as statements:
+        response = client.get(f'/users/{user_id}/favorites', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['favorites'], len(statements)
+
+
+def test_get_favorites_query_count_does_not_grow(client, count_queries):
+    few_user, many_user = add_users(2)
+    add_favorites(few_user, 1, 'Few')
+    add_favorites(many_user, 100, 'Many')
+
+    few, few_queries = favorites_queries(client, count_queries, few_user)
+    many, many_queries = favorites_queries(client, count_queries, many_user)
+
+    assert len(few) == 2
+    assert len(many) == 200
+    assert all(favorite['details'] is not None for favorite in many)
+    # Versiones (ETag), token revocado, usuario y favoritos con sus personajes y planetas
+    assert many_queries == few_queries
+    assert many_queries <= 4
+
+
+def profile_queries(client, count_queries, user_id, **params):
+    headers = auth_headers(user_id)
+    with count_queries() as statements:
+        response = client.get(f'/users/{user_id}/profile', headers=headers, query_string=params)
+    assert response.status_code == 200
+    return response.get_json(), len(statements)
+
+
+def test_get_profile_query_count_does_not_grow(client, count_queries):
+    few_user, many_user = add_users(2)
+    add_favorites(few_user, 1, 'Few')
+    add_favorites(many_user, 100, 'Many')
+
+    few, few_queries = profile_queries(client, count_queries, few_user)
+    many, many_queries = profile_queries(client, count_queries, many_user)
+
+    assert few['counts'] == {'people': 1, 'planets': 1, 'total': 2}
+    assert many['counts'] == {'people': 100, 'planets': 100, 'total': 200}
+    assert len(many['favorites']) == 200
+    assert all(favorite['details'] is not None for favorite in many['favorites'])
+    # En frío: token revocado, versiones (ETag), usuario y favoritos
+    assert many_queries == few_queries
+    assert many_queries <= 4
+
+    # Sin favoritos, los contadores salen de un solo COUNT
+    counts_only, counts_queries = profile_queries(client, count_queries, many_user, include='counts')
+    assert counts_only['counts'] == many['counts']
+    assert 'favorites' not in counts_only
+    assert counts_queries <= many_queries
+
+
+def delete_person_statements(client, count_queries, people_id):
+    with count_queries() as statements:
+        response = client.delete(f'/people/{people_id}')
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_delete_people_cascades_favorites(client, count_queries):
+    user_ids = add_users(1000)
+    lonely, popular = add_people(2)
+    db.session.execute(insert(Favorites), [{'user_id': user_ids[0], 'people_id': lonely}])
+    db.session.execute(insert(Favorites), [
+        {'user_id': user_id, 'people_id': popular} for user_id in user_ids
+    ])
+    db.session.commit()
+
+    lonely_statements = delete_person_statements(client, count_queries, lonely)
+    popular_statements = delete_person_statements(client, count_queries, popular)
+
+    # La base de datos borra los favoritos (ON DELETE CASCADE): el número de
+    # sentencias no depende de cuántos haya
+    # (personaje, DELETE y las versiones de people y favorites)
+    assert popular_statements == lonely_statements
+    assert popular_statements <= 4
+    db.session.expire_all()
+    assert db.session.get(People, popular) is None
+    assert db.session.scalar(
+        select(func.count(Favorites.id)).where(Favorites.people_id.in_([lonely, popular]))
+    ) == 0
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from models import db, People, IdempotencyKey
+from idempotency import _record_id, _request_hash, _reserve
+
+PERSON = {'name': 'Luke', 'gender': 'male', 'species': 'human'}
+
+
+def create(client, key, body=PERSON):
+    return client.post('/people', json=body, headers={'Idempotency-Key': key})
+
+
+def reserve_pending(app, key, body=PERSON, created_at=None):
+    # Reserva la clave como lo haría una petición que sigue en curso
+    with app.test_request_context('/people', method='POST', json=body, headers={'Idempotency-Key': key}):
+        record_id = _record_id(key)
+        assert _reserve(record_id, _request_hash()) is None
+        if created_at is not None:
+            db.session.get(IdempotencyKey, record_id).created_at = created_at
+            db.session.commit()
+
+
+def test_replay_returns_stored_response_without_new_row(client):
+    first = create(client, 'key-1')
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    replay = create(client, 'key-1')
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == first.get_json()
+    assert People.query.count() == 1
+
+
+def test_same_key_with_other_body_is_422(client):
+    assert create(client, 'key-1').status_code == 201
+    response = create(client, 'key-1', {**PERSON, 'name': 'Leia'})
+    assert response.status_code == 422
+    assert People.query.count() == 1
+
+
+def test_pending_key_is_409(app, client):
+    reserve_pending(app, 'key-1')
+
+    response = create(client, 'key-1')
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert People.query.count() == 0
+
+
+def test_abandoned_key_is_taken_over(app, client):
+    lock_timeout = app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+    reserve_pending(app, 'key-1', created_at=datetime.utcnow() - timedelta(seconds=lock_timeout + 1))
+
+    response = create(client, 'key-1')
+    assert response.status_code == 201
+    assert People.query.count() == 1
+    assert db.session.query(IdempotencyKey).one().status_code == 201
+
+
+def test_exception_in_view_leaves_no_entity_and_no_key(client, monkeypatch):
+    def fail(self):
+        raise RuntimeError('fallo tras el commit de la vista')
+    # create_character hace commit() y después serializa: el commit solo fue un flush
+    monkeypatch.setattr(People, 'serialize', fail)
+
+    response = create(client, 'key-1')
+    assert response.status_code == 500
+    db.session.expire_all()
+    assert People.query.count() == 0
+    assert IdempotencyKey.query.count() == 0
@@ -0,0 +1,64 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import DB_PATH, add_people
+from models import db
+from replicas import configure_replicas, replicas, PRIMARY_COOKIE
+
+
+@pytest.fixture
+def replica_files(app, tmp_path, monkeypatch):
+    """Dos réplicas SQLite: copias de la principal con otro nombre en el personaje 1."""
+    add_people(1, 'primary')
+    db.session.remove()
+    paths = []
+    for name in ('replica1', 'replica2'):
+        path = tmp_path / f'{name}.db'
+        shutil.copy(DB_PATH, path)
+        with sqlite3.connect(path) as connection:
+            connection.execute('UPDATE people SET name = ?', (name,))
+        paths.append(path)
+
+    monkeypatch.setitem(app.config, 'DATABASE_REPLICA_URLS', ','.join(f'sqlite:///{path}' for path in paths))
+    configure_replicas(app)
+    yield paths
+    monkeypatch.setitem(app.config, 'DATABASE_REPLICA_URLS', '')
+    configure_replicas(app)
+
+
+def read_name(client):
+    response = client.get('/people')
+    assert response.status_code == 200
+    return response.get_json()[0]['name']
+
+
+def test_reads_round_robin_between_replicas(client, replica_files):
+    assert [read_name(client) for _ in range(4)] == ['replica1', 'replica2', 'replica1', 'replica2']
+    # Las rutas sin @read_only leen de la principal
+    assert client.get('/people/1').get_json()['people']['name'] == 'primary 0'
+
+
+def test_unreadable_replica_fails_over(client, replica_files):
+    replicas.replicas[0].engine.dispose()
+    replica_files[0].write_bytes(b'not a database' * 100)
+
+    # La petición que encuentra la réplica rota se repite en la principal
+    assert read_name(client) == 'primary 0'
+    assert [read_name(client) for _ in range(2)] == ['replica2', 'replica2']
+    status = replicas.status()
+    assert [replica['healthy'] for replica in status] == [False, True]
+    assert status[0]['failures'] == 1
+
+
+def test_read_primary_cookie_after_write(client, replica_files):
+    response = client.put('/people/1', json={'species': 'jedi'})
+    assert response.status_code == 200
+    assert f'{PRIMARY_COOKIE}=1' in response.headers['Set-Cookie']
+
+    # El cliente devuelve la cookie: lee de la principal
+    assert read_name(client) == 'primary 0'
+
+    client.cookie_jar.clear()
+    assert read_name(client) in ('replica1', 'replica2')
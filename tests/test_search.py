@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import text
+
+from models import db, People
+from search import create_search_index
+
+
+def add_people(*rows):
+    db.session.add_all([People(name=name, gender='n/a', species=species) for name, species in rows])
+    db.session.commit()
+
+
+@pytest.fixture
+def search_index(app):
+    create_search_index(db.session.connection())
+    db.session.commit()
+    yield
+    # drop_all no conoce las tablas FTS5: se borran aquí
+    for table in ('people', 'planet'):
+        db.session.execute(text(f'DROP TABLE IF EXISTS {table}_fts'))
+    db.session.commit()
+
+
+def search(client, **params):
+    response = client.get('/search', query_string={'type': 'people', **params})
+    assert response.status_code == 200
+    return response.get_json()['people']
+
+
+def test_search_ranks_best_match_first(client, search_index):
+    add_people(('Luke Skywalker', 'human'), ('Leia Organa', 'human'), ('Luke', 'luke clone'))
+
+    names = [person['name'] for person in search(client, q='luke')['results']]
+    # Los dos coinciden; el que repite el término va primero aunque tenga un id mayor
+    assert names == ['Luke', 'Luke Skywalker']
+    # Búsqueda por prefijo
+    assert [person['name'] for person in search(client, q='sky')['results']] == ['Luke Skywalker']
+
+
+def test_search_next_offset(client, search_index):
+    add_people(*[(f'Droid {i}', 'droid') for i in range(5)])
+
+    first = search(client, q='droid', limit=2)
+    assert len(first['results']) == 2
+    assert first['next_offset'] == 2
+
+    last = search(client, q='droid', limit=2, offset=4)
+    assert len(last['results']) == 1
+    assert last['next_offset'] is None
+
+    seen = [person['id'] for offset in (0, 2, 4) for person in search(client, q='droid', limit=2, offset=offset)['results']]
+    assert sorted(seen) == sorted(set(seen)) and len(seen) == 5
+
+
+def test_search_without_fts_tables_falls_back_to_like(client):
+    # Base de datos creada con db.create_all(), sin la migración de búsqueda
+    add_people(('Luke Skywalker', 'human'), ('Leia Organa', 'human'))
+
+    page = search(client, q='lu')
+    assert [person['name'] for person in page['results']] == ['Luke Skywalker']
+    assert page['next_offset'] is None